@@ -0,0 +1,169 @@
+# %%
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from aggregate import Moments
+from bb84_protocol import EveConfig, simulate_session
+from protocols import BB84
+
+METRICS = ("QBER", "Sift Ratio", "Key Rate", "Detection")
+
+
+def wilson_interval(successes, n, z):
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denom
+    half = z / denom * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2))
+    return center - half, center + half
+
+
+@dataclass
+class ScenarioPoint:
+    name: str
+    eve_config: EveConfig
+    noise: float
+    qber: Moments = field(default_factory=Moments)
+    sift_ratio: Moments = field(default_factory=Moments)
+    key_rate: Moments = field(default_factory=Moments)
+    detections: int = 0
+
+    @property
+    def sessions(self):
+        return self.qber.count
+
+    def add(self, qber, sift_ratio, threshold):
+        # key rate: asymptotic secret bits per qubit sent, QBERs past 0.5
+        # clipped so they yield no key
+        self.qber = self.qber + Moments.of(qber)
+        self.sift_ratio = self.sift_ratio + Moments.of(sift_ratio)
+        key_rate = BB84.secret_fraction(np.minimum(qber, 0.5)) * sift_ratio
+        self.key_rate = self.key_rate + Moments.of(key_rate)
+        self.detections += int((qber > threshold).sum())
+
+    def interval(self, metric, z):
+        if metric == "Detection":
+            return wilson_interval(self.detections, self.sessions, z)
+        moments = {
+            "QBER": self.qber,
+            "Sift Ratio": self.sift_ratio,
+            "Key Rate": self.key_rate,
+        }[metric]
+        if moments.count < 2:
+            return -np.inf, np.inf
+        half = z * moments.std / np.sqrt(moments.count)
+        return moments.mean - half, moments.mean + half
+
+
+def run_adaptive(
+    scenarios,
+    n_qubits=50,
+    metric="Detection",
+    target_width=0.05,
+    threshold=0.11,
+    confidence=0.95,
+    min_sessions=32,
+    max_sessions=100_000,
+    rng=None,
+    round_budget=None,
+):
+    # Sequential design: every round each unconverged point gets the sessions
+    # its current CI width says it still needs (width shrinks as 1/sqrt(n)),
+    # capped at doubling so a noisy early variance cannot overshoot. Points far
+    # from the threshold detect with p ~ 0 or 1 and stop almost immediately.
+    # Without round_budget the points stop independently, so the ambiguous
+    # ones near the threshold end up with more sessions but nothing is taken
+    # from the others. With it, each round's sessions are capped at
+    # round_budget and shared in proportion to what each point still needs,
+    # which goes as its squared CI width, so the widest intervals go first.
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Choose from {METRICS}")
+    if rng is None:
+        rng = np.random.default_rng()
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    points = [ScenarioPoint(name, cfg, noise) for name, cfg, noise in scenarios]
+    batches = {id(p): min_sessions for p in points}
+    rounds = 0
+
+    while batches:
+        rounds += 1
+        for point in points:
+            n = batches.get(id(point), 0)
+            if n == 0:
+                continue
+            qber, sifted = simulate_session(
+                n_qubits, point.eve_config, point.noise, rng, n_sessions=n
+            ).qber()
+            point.add(qber, sifted / n_qubits, threshold)
+
+        batches = {}
+        for point in points:
+            lo, hi = point.interval(metric, z)
+            width = hi - lo
+            if width <= target_width or point.sessions >= max_sessions:
+                continue
+            needed = int(np.ceil(point.sessions * (width / target_width) ** 2))
+            extra = min(needed, 2 * point.sessions, max_sessions) - point.sessions
+            batches[id(point)] = max(extra, 1)
+
+        requested = sum(batches.values())
+        if round_budget is not None and requested > round_budget:
+            scale = round_budget / requested
+            batches = {key: max(int(n * scale), 1) for key, n in batches.items()}
+
+    rows = []
+    for point in points:
+        lo, hi = point.interval(metric, z)
+        rows.append(
+            {
+                "Scenario": point.name,
+                "Noise": point.noise,
+                "Eve Rate": (
+                    point.eve_config.intercept_rate if point.eve_config.active else 0.0
+                ),
+                "Sessions": point.sessions,
+                "Qubits": point.sessions * n_qubits,
+                "QBER": point.qber.mean,
+                "Sift Ratio": point.sift_ratio.mean,
+                "Key Rate": point.key_rate.mean,
+                "Detection Probability": point.detections / point.sessions,
+                f"{metric} CI Low": lo,
+                f"{metric} CI High": hi,
+                "Converged": hi - lo <= target_width,
+            }
+        )
+    df = pd.DataFrame(rows)
+    df.attrs["rounds"] = rounds
+    return df
+
+
+def intercept_sweep(rates, noise=0.0):
+    return [
+        (f"Eve {rate:.0%}", EveConfig(active=rate > 0, intercept_rate=rate), noise)
+        for rate in rates
+    ]
+
+
+# %%
+if __name__ == "__main__":
+    scenarios = intercept_sweep(np.linspace(0.0, 1.0, 21), noise=0.01)
+    df = run_adaptive(
+        scenarios,
+        n_qubits=50,
+        metric="Detection",
+        target_width=0.02,
+        rng=np.random.default_rng(0),
+    )
+    print(df[["Scenario", "Sessions", "QBER", "Detection Probability"]].to_string())
+
+    # a fixed design must give every point the worst case sample size
+    fixed = df["Sessions"].max() * len(df) * 50
+    print(
+        f"adaptive: {df['Qubits'].sum():,} qubits in {df.attrs['rounds']} rounds, "
+        f"fixed design: {fixed:,} qubits ({fixed / df['Qubits'].sum():.1f}x)"
+    )
@@ -0,0 +1,365 @@
+# %%
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class Histogram:
+    counts: np.ndarray
+    edges: np.ndarray
+
+    def __add__(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms must share bin edges to be merged")
+        return Histogram(self.counts + other.counts, self.edges)
+
+
+@dataclass
+class DensityGrid:
+    counts: np.ndarray  # shape (len(xedges) - 1, len(yedges) - 1)
+    xedges: np.ndarray
+    yedges: np.ndarray
+
+    def __add__(self, other):
+        if not (
+            np.array_equal(self.xedges, other.xedges)
+            and np.array_equal(self.yedges, other.yedges)
+        ):
+            raise ValueError("Density grids must share bin edges to be merged")
+        return DensityGrid(self.counts + other.counts, self.xedges, self.yedges)
+
+
+@dataclass
+class Series:
+    x: np.ndarray
+    y: np.ndarray
+
+    def __len__(self):
+        return len(self.y)
+
+
+def histogram(values, bins=20, range=None):
+    counts, edges = np.histogram(np.asarray(values, dtype=float), bins, range)
+    return Histogram(counts, edges)
+
+
+def density_grid(x, y, bins=(64, 64), range=None):
+    counts, xedges, yedges = np.histogram2d(
+        np.asarray(x, dtype=float), np.asarray(y, dtype=float), bins, range
+    )
+    return DensityGrid(counts, xedges, yedges)
+
+
+def grouped_histograms(df, column="QBER", by="Eve Present", bins=20, range=None):
+    # shared edges across groups so the bars line up and chunks can be merged
+    if range is None:
+        values = df[column].to_numpy(dtype=float)
+        range = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+    return {
+        label: histogram(group[column], bins, range) for label, group in df.groupby(by)
+    }
+
+
+def grouped_density(
+    df, x="QBER", y="Sift Ratio", by="Eve Present", bins=(64, 64), range=None
+):
+    if range is None:
+        xs, ys = df[x].to_numpy(dtype=float), df[y].to_numpy(dtype=float)
+        range = [(xs.min(), xs.max()), (ys.min(), ys.max())] if len(xs) else None
+    return {
+        label: density_grid(group[x], group[y], bins, range)
+        for label, group in df.groupby(by)
+    }
+
+
+def minmax_decimate(y, n_bins, x=None):
+    # keep the min and max of every bucket, so spikes survive decimation
+    y = np.asarray(y)
+    x = np.arange(1, len(y) + 1) if x is None else np.asarray(x)
+    if len(y) <= 2 * n_bins:
+        return Series(x, y)
+
+    size = -(-len(y) // n_bins)
+    padded = np.pad(y, (0, n_bins * size - len(y)), mode="edge").reshape(n_bins, -1)
+    base = np.arange(n_bins)[:, None] * size
+    picks = np.sort(
+        np.stack([padded.argmin(axis=1), padded.argmax(axis=1)], axis=1), axis=1
+    )
+    idx = np.unique(np.minimum(base + picks, len(y) - 1))
+    return Series(x[idx], y[idx])
+
+
+def lttb(y, n_out, x=None):
+    # largest-triangle-three-buckets; the scan over buckets is sequential but
+    # each bucket is scored vectorized, so cost is O(len(y)) plus n_out steps
+    y = np.asarray(y, dtype=float)
+    x = np.arange(1, len(y) + 1, dtype=float) if x is None else np.asarray(x, float)
+    if n_out >= len(y) or n_out < 3:
+        return Series(x, y)
+
+    edges = np.linspace(1, len(y) - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, len(y) - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else len(y)
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(area.argmax())
+        idx[i + 1] = prev
+
+    return Series(x[idx], y[idx])
+
+
+def decimate(y, max_points, x=None, method="minmax"):
+    if isinstance(y, Series):
+        x, y = y.x, y.y
+    if method == "minmax":
+        return minmax_decimate(y, max_points // 2, x)
+    if method == "lttb":
+        return lttb(y, max_points, x)
+    raise ValueError(f"Unknown decimation method: {method}")
+
+
+@dataclass
+class Moments:
+    # count, mean and sum of squared deviations, merged with Chan et al.'s
+    # pairwise update so partial results combine exactly in any order
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = np.inf
+    max: float = -np.inf
+
+    @classmethod
+    def of(cls, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return cls()
+        mean = values.mean()
+        return cls(
+            len(values),
+            float(mean),
+            float(((values - mean) ** 2).sum()),
+            float(values.min()),
+            float(values.max()),
+        )
+
+    def __add__(self, other):
+        if other.count == 0:
+            return Moments(self.count, self.mean, self.m2, self.min, self.max)
+        if self.count == 0:
+            return Moments(other.count, other.mean, other.m2, other.min, other.max)
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return Moments(
+            count,
+            self.mean + delta * other.count / count,
+            self.m2 + other.m2 + delta**2 * self.count * other.count / count,
+            min(self.min, other.min),
+            max(self.max, other.max),
+        )
+
+    def update(self, values):
+        merged = self + Moments.of(values)
+        self.count, self.mean, self.m2 = merged.count, merged.mean, merged.m2
+        self.min, self.max = merged.min, merged.max
+        return self
+
+    @property
+    def var(self):
+        # sample variance, as pandas reports it
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+class QuantileSketch:
+    # DDSketch: log-spaced buckets give every quantile within `relative_accuracy`
+    # of the true value, and sketches with the same accuracy merge by adding
+    # bucket counts
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add_buckets(self, store, values):
+        idx, counts = np.unique(
+            np.ceil(np.log(values) / self.log_gamma).astype(np.int64),
+            return_counts=True,
+        )
+        for i, c in zip(idx.tolist(), counts.tolist()):
+            store[i] = store.get(i, 0) + c
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count += len(values)
+        self.zero_count += int((values == 0).sum())
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+        return self
+
+    def __add__(self, other):
+        if self.gamma != other.gamma:
+            raise ValueError("Sketches must share relative accuracy to be merged")
+        merged = QuantileSketch(self.relative_accuracy)
+        for store, a, b in [
+            (merged.positive, self.positive, other.positive),
+            (merged.negative, self.negative, other.negative),
+        ]:
+            store.update(a)
+            for i, c in b.items():
+                store[i] = store.get(i, 0) + c
+        merged.zero_count = self.zero_count + other.zero_count
+        merged.count = self.count + other.count
+        return merged
+
+    def _value(self, i):
+        return 2 * self.gamma**i / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+
+        seen = 0
+        for i in sorted(self.negative, reverse=True):
+            seen += self.negative[i]
+            if seen > rank:
+                return -self._value(i)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for i in sorted(self.positive):
+            seen += self.positive[i]
+            if seen > rank:
+                return self._value(i)
+        return self._value(max(self.positive))
+
+
+@dataclass
+class ColumnStats:
+    moments: Moments
+    sketch: QuantileSketch
+    hist: Histogram = None
+
+    def __add__(self, other):
+        return ColumnStats(
+            self.moments + other.moments,
+            self.sketch + other.sketch,
+            None if self.hist is None else self.hist + other.hist,
+        )
+
+
+class GroupedSummary:
+    # per-group accumulators for a few columns; memory is O(groups) however
+    # many sessions are folded in, and summaries from workers merge with +
+
+    def __init__(
+        self,
+        columns=("QBER", "Sift Ratio", "Key Length"),
+        by="Eve Present",
+        hist_edges=None,
+        relative_accuracy=0.01,
+    ):
+        self.columns = list(columns)
+        self.by = by
+        # {column: edges}; fixed edges keep histograms mergeable across chunks
+        self.hist_edges = hist_edges or {}
+        self.relative_accuracy = relative_accuracy
+        self.groups = {}
+
+    def _empty(self, column):
+        edges = self.hist_edges.get(column)
+        hist = (
+            None if edges is None else Histogram(np.zeros(len(edges) - 1, int), edges)
+        )
+        return ColumnStats(Moments(), QuantileSketch(self.relative_accuracy), hist)
+
+    def update(self, df):
+        keys, inverse = np.unique(df[self.by].to_numpy(), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        for column in self.columns:
+            values = df[column].to_numpy(dtype=float)
+            # chunk moments for every group at once, then a Chan merge per group
+            means = np.bincount(inverse, values, len(keys)) / counts
+            m2 = np.bincount(inverse, (values - means[inverse]) ** 2, len(keys))
+            mins = np.full(len(keys), np.inf)
+            maxs = np.full(len(keys), -np.inf)
+            np.minimum.at(mins, inverse, values)
+            np.maximum.at(maxs, inverse, values)
+
+            for g, key in enumerate(keys.tolist()):
+                stats = self.groups.setdefault(key, {}).get(column)
+                if stats is None:
+                    stats = self.groups[key][column] = self._empty(column)
+                group_values = values[inverse == g]
+                stats.moments = stats.moments + Moments(
+                    int(counts[g]), means[g], m2[g], mins[g], maxs[g]
+                )
+                stats.sketch.update(group_values)
+                if stats.hist is not None:
+                    stats.hist = stats.hist + histogram(group_values, stats.hist.edges)
+        return self
+
+    def __add__(self, other):
+        merged = GroupedSummary(
+            self.columns, self.by, self.hist_edges, self.relative_accuracy
+        )
+        for key in set(self.groups) | set(other.groups):
+            merged.groups[key] = {}
+            for column in self.columns:
+                # start from empty stats so the inputs are never aliased
+                stats = self._empty(column)
+                for part in (self.groups.get(key, {}), other.groups.get(key, {})):
+                    if column in part:
+                        stats = stats + part[column]
+                merged.groups[key][column] = stats
+        return merged
+
+    def quantiles(self, column, qs=(0.5, 0.9, 0.99)):
+        return pd.DataFrame(
+            {
+                f"q{q:g}": {
+                    key: stats[column].sketch.quantile(q)
+                    for key, stats in self.groups.items()
+                }
+                for q in qs
+            }
+        ).rename_axis(self.by)
+
+    def to_frame(self, stats=None):
+        # same layout as BB84Analyzer.compute_summary_statistics
+        if stats is None:
+            stats = {
+                "QBER": ["mean", "std", "min", "max"],
+                "Sift Ratio": ["mean", "std"],
+                "Key Length": ["mean", "std"],
+            }
+        rows = {}
+        for key in sorted(self.groups):
+            rows[key] = {
+                (column, stat): getattr(self.groups[key][column].moments, stat)
+                for column, names in stats.items()
+                for stat in names
+            }
+        df = pd.DataFrame.from_dict(rows, orient="index")
+        df.columns = pd.MultiIndex.from_tuples(df.columns)
+        return df.rename_axis(self.by).round(4)
@@ -1,13 +1,21 @@
 import numpy as np
 import pandas as pd
 from bb84_protocol import BB84Protocol, EveConfig
+from archive import SessionArchive
+from replay import iter_replay, replay_archives
+from aggregate import GroupedSummary
+from adaptive import run_adaptive
+from protocols import PROTOCOLS, get_protocol, sweep
 
 
 class BB84Analyzer:
 
     @staticmethod
-    def generate_dataset(n_sessions=50, n_qubits=50, noise_level=0.02, eve_rate=0.5):
+    def generate_dataset(
+        n_sessions=50, n_qubits=50, noise_level=0.02, eve_rate=0.5, progress=None
+    ):
         data = []
+        total = 2 * (n_sessions // 2)
 
         # Sessions without Eve
         for _ in range(n_sessions // 2):
@@ -26,6 +34,8 @@ class BB84Analyzer:
                     "Eve Present": "No",
                 }
             )
+            if progress is not None:
+                progress(len(data) / total)
 
         for _ in range(n_sessions // 2):
             bb84 = BB84Protocol(n_qubits)
@@ -45,11 +55,30 @@ class BB84Analyzer:
                     "Eve Present": "Yes",
                 }
             )
+            if progress is not None:
+                progress(len(data) / total)
 
         return pd.DataFrame(data)
 
+    @staticmethod
+    def archive_dataset(path):
+        # same columns as generate_dataset, read from the archive index
+        return SessionArchive(path).summary()
+
+    @staticmethod
+    def replay_dataset(
+        paths, threshold=0.11, max_rounds=None, chunk_sessions=1 << 16, workers=None
+    ):
+        # recompute metrics and verdicts from archived rounds, no re-simulation
+        return replay_archives(
+            paths, threshold, max_rounds, chunk_sessions, workers=workers
+        )
+
     @staticmethod
     def compute_summary_statistics(df):
+        if isinstance(df, GroupedSummary):
+            return df.to_frame()
+
         summary = (
             df.groupby("Eve Present")
             .agg(
@@ -65,20 +94,125 @@ class BB84Analyzer:
         return summary
 
     @staticmethod
-    def test_scenarios(scenarios, n_qubits=50):
+    def accumulate_summary(frames, by="Eve Present", summary=None, **kwargs):
+        # fold DataFrame chunks into per-group accumulators; results from
+        # separate workers combine with +
+        if summary is None:
+            summary = GroupedSummary(by=by, **kwargs)
+        for df in frames:
+            summary.update(df)
+        return summary
+
+    @staticmethod
+    def replay_summary(paths, threshold=0.11, max_rounds=None, chunk_sessions=1 << 16):
+        # summary statistics over archives without materializing the sessions
+        if isinstance(paths, str):
+            paths = [paths]
+        summary = GroupedSummary()
+        for path in paths:
+            BB84Analyzer.accumulate_summary(
+                iter_replay(path, threshold, max_rounds, chunk_sessions),
+                summary=summary,
+            )
+        return summary
+
+    @staticmethod
+    def adaptive_scenarios(
+        scenarios,
+        n_qubits=50,
+        metric="Detection",
+        target_width=0.05,
+        threshold=0.11,
+        max_sessions=100_000,
+        rng=None,
+        round_budget=None,
+    ):
+        # like test_scenarios, but each point runs until its CI is narrow enough
+        return run_adaptive(
+            scenarios,
+            n_qubits,
+            metric,
+            target_width,
+            threshold,
+            max_sessions=max_sessions,
+            rng=rng,
+            round_budget=round_budget,
+        )
+
+    @staticmethod
+    def compare_protocols(
+        protocols=None,
+        noise_levels=(0.0, 0.02, 0.05),
+        intercept_rates=(0.0, 0.2, 0.5, 1.0),
+        n_rounds=1_000_000,
+        threshold=0.11,
+        rng=None,
+    ):
+        # key rate and QBER response to Eve for each protocol, n_rounds per cell
+        if rng is None:
+            rng = np.random.default_rng()
+        if protocols is None:
+            protocols = list(PROTOCOLS)
+
+        results = []
+        for name in protocols:
+            protocol = get_protocol(name)
+            for noise in noise_levels:
+                for rate in intercept_rates:
+                    eve_cfg = EveConfig(active=rate > 0, intercept_rate=rate)
+                    sifted, errors = sweep(protocol, n_rounds, eve_cfg, noise, rng)
+                    qber = errors / sifted if sifted else 0.0
+                    fraction = float(protocol.secret_fraction(qber))
+                    results.append(
+                        {
+                            "Protocol": protocol.name,
+                            "Noise": noise,
+                            "Eve Rate": rate,
+                            "Sift Ratio": sifted / n_rounds,
+                            "QBER": qber,
+                            "Secret Fraction": fraction,
+                            "Key Rate": fraction * sifted / n_rounds,
+                            "Detection": (
+                                "High risk" if qber > threshold else "Acceptable"
+                            ),
+                        }
+                    )
+
+        df = pd.DataFrame(results)
+        # QBER added by Eve on top of the channel noise alone
+        baseline = df[df["Eve Rate"] == 0].set_index(["Protocol", "Noise"])["QBER"]
+        df["QBER Increase"] = (
+            df["QBER"].to_numpy()
+            - baseline.reindex(
+                pd.MultiIndex.from_frame(df[["Protocol", "Noise"]])
+            ).to_numpy()
+        )
+        return df
+
+    @staticmethod
+    def test_scenarios(
+        scenarios,
+        n_qubits=50,
+        engine="qiskit",
+        formatted=True,
+        threshold=0.11,
+        rng=None,
+    ):
         results = []
 
         for name, eve_cfg, noise in scenarios:
             bb84 = BB84Protocol(n_qubits)
-            qber, key_len = bb84.run_session(eve_cfg, noise)
+            qber, key_len = bb84.run_session(eve_cfg, noise, engine=engine, rng=rng)
 
             results.append(
                 {
                     "Scenario": name,
-                    "QBER": f"{qber:.3f}",
+                    "QBER": f"{qber:.3f}" if formatted else float(qber),
                     "Key Length": key_len,
-                    "Sift Ratio": f"{key_len/n_qubits:.2%}",
-                    "Detection": "High risk" if qber > 0.11 else "Acceptable",
+                    "Sift Ratio": (
+                        f"{key_len/n_qubits:.2%}" if formatted else key_len / n_qubits
+                    ),
+                    "Detection": "High risk" if qber > threshold else "Acceptable",
                 }
             )
 
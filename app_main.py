@@ -1,12 +1,67 @@
 import streamlit as st
 import time
+import uuid
 import numpy as np
+import pandas as pd
 
-from bb84_protocol import BB84Protocol, EveConfig
+from bb84_protocol import BASES, BB84Protocol, EveConfig
 from ml import MLDetector
 from visualizer import BB84Visualizer
-from game import BB84Game
+from game import DIFFICULTY_THRESHOLDS, BB84Game
 from analyzer import BB84Analyzer
+from strategy import best_strategies, optimize_strategies
+from estimation import optimize_estimation
+from jobs import JobManager
+
+# Live Animation playback: frames per run and rounds shown in the channel table
+ANIMATION_FRAMES = 50
+ANIMATION_WINDOW = 12
+# Interactive Game: rounds per page of the transmission history
+HISTORY_PAGE_SIZE = 20
+# background jobs: seconds between progress polls
+JOB_POLL_INTERVAL = 0.5
+
+
+@st.cache_resource
+def get_job_manager():
+    # one pool shared by every browser session of this server
+    return JobManager(max_workers=4, kind="thread", max_finished=256, ttl=3600)
+
+
+def poll_job(state_key):
+    # render a running job's progress; returns the job once it is finished
+    job_id = st.session_state.get(state_key)
+    if job_id is None:
+        return None
+
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        st.session_state[state_key] = None
+        st.warning("Job results expired, please run it again")
+        return None
+
+    if not job.done:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.progress(job.progress, text=f"{job.name}: {job.status}")
+        with col2:
+            if st.button("Cancel", key=f"cancel_{state_key}"):
+                manager.cancel(job_id)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+    if job.status == "failed":
+        st.error(f"{job.name} failed: {job.error}")
+    elif job.status == "cancelled":
+        st.info(f"{job.name} cancelled")
+    return job
+
+
+def train_and_evaluate(scenarios, n_sessions, n_qubits, progress=None):
+    detector = MLDetector()
+    detector.train(n_sessions=n_sessions, n_qubits=n_qubits, progress=progress)
+    return detector, detector.evaluate_scenarios(scenarios, n_qubits=n_qubits)
 
 
 # Page
@@ -23,6 +78,13 @@ if "game_active" not in st.session_state:
     st.session_state.game_active = False
 if "ml_detector" not in st.session_state:
     st.session_state.ml_detector = None
+if "analysis_job" not in st.session_state:
+    st.session_state.analysis_job = None
+if "ml_job" not in st.session_state:
+    st.session_state.ml_job = None
+if "plot_key" not in st.session_state:
+    # reused figures are cached per browser session
+    st.session_state.plot_key = uuid.uuid4().hex
 
 st.title("BB84 Quantum Key Distribution")
 
@@ -52,7 +114,7 @@ with st.sidebar:
 if mode == "Live Animation":
     st.header("Live BB84 Protocol Animation")
 
-    st.markdown("Watch the BB84 protocol in action with quantum circuits.")
+    st.markdown("Watch the BB84 protocol in action.")
 
     # Settings
     col1, col2 = st.columns([3, 1])
@@ -94,104 +156,81 @@ if mode == "Live Animation":
     if st.button(
         "Run BB84 Protocol", type="primary", use_container_width=True, key="run_anim"
     ):
+        # simulate the whole session up front, the loop below only plays it back
         bb84_anim = BB84Protocol(n_qubits_anim)
+        final_qber, final_key_len = bb84_anim.run_session(
+            EveConfig(active=eve_enabled_anim, intercept_rate=eve_intercept_anim),
+            noise_anim,
+            engine="vectorized",
+        )
+        rounds = bb84_anim.session_rounds()
+
+        kept = rounds.sift_mask()
+        wrong = rounds.alice_bits != rounds.bob_bits
+        kept_counts = np.cumsum(kept)
+        error_counts = np.cumsum(kept & wrong)
+        qber_curve = np.divide(
+            error_counts,
+            kept_counts,
+            out=np.zeros(n_qubits_anim),
+            where=kept_counts > 0,
+        )
+
+        eve_bases = BASES[rounds.eve_bases]
+        channel_df = pd.DataFrame(
+            {
+                "Round": np.arange(1, n_qubits_anim + 1),
+                "Alice Basis": bb84_anim.alice_bases,
+                "Alice Bit": rounds.alice_bits,
+                "Eve" if eve_enabled_anim else "Channel": np.where(
+                    rounds.eve_mask,
+                    np.char.add("INTERCEPTED (", np.char.add(eve_bases, ")")),
+                    "Passed through",
+                ),
+                "Bob Basis": bb84_anim.bob_bases,
+                "Bob Bit": rounds.bob_bits,
+                "Result": np.where(kept, np.where(wrong, "Error", "Kept"), "Discarded"),
+            }
+        )
 
         status_placeholder = st.empty()
         progress_bar = st.progress(0)
 
         st.markdown("### Quantum Channel")
-        col_a, col_b, col_c = st.columns(3)
-
-        with col_a:
-            st.markdown("#### Alice")
-            alice_container = st.container()
-        with col_b:
-            st.markdown("#### Eve" if eve_enabled_anim else "#### Channel")
-            eve_container = st.container()
-        with col_c:
-            st.markdown("#### Bob")
-            bob_container = st.container()
+        channel_placeholder = st.empty()
 
         st.markdown("---")
         st.markdown("### Real-time Statistics")
         stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
-
-        kept_count = 0
-        error_count = 0
-
-        # Animate rounds
-        for i in range(min(50, n_qubits_anim)):
-            progress = (i + 1) / min(50, n_qubits_anim)
-            progress_bar.progress(progress)
-            status_placeholder.info(f"Sending qubit {i+1}/{min(50, n_qubits_anim)}...")
-
-            eve_intercepts_now = eve_enabled_anim and (
-                np.random.rand() < eve_intercept_anim
-            )
-            eve_basis_now = np.random.choice(["Z", "X"]) if eve_intercepts_now else None
-
-            alice_bit, alice_basis, bob_bit, bob_basis = bb84_anim.send_qubit(
-                eve_intercepts=eve_intercepts_now, eve_basis=eve_basis_now
+        sent_metric = stats_col1.empty()
+        kept_metric = stats_col2.empty()
+        errors_metric = stats_col3.empty()
+        qber_metric = stats_col4.empty()
+
+        # fixed number of frames, each frame advances a batch of rounds and
+        # redraws the same placeholders
+        frame_ends = np.unique(
+            np.linspace(0, n_qubits_anim, ANIMATION_FRAMES + 1).astype(int)[1:]
+        )
+        for end in frame_ends:
+            progress_bar.progress(end / n_qubits_anim)
+            status_placeholder.info(f"Sending qubit {end}/{n_qubits_anim}...")
+
+            channel_placeholder.dataframe(
+                channel_df.iloc[max(0, end - ANIMATION_WINDOW) : end],
+                use_container_width=True,
+                hide_index=True,
             )
-
-            with alice_container:
-                st.markdown(f"**Round {i+1}**")
-                st.markdown(f"Basis: `{alice_basis}`")
-                st.markdown(f"Bit: `{alice_bit}`")
-
-            with eve_container:
-                if eve_intercepts_now:
-                    st.markdown("**INTERCEPTED**")
-                    st.markdown(f"Measured: `{eve_basis_now}`")
-                else:
-                    st.markdown("Passed through")
-
-            with bob_container:
-                st.markdown(f"**Round {i+1}**")
-                st.markdown(f"Basis: `{bob_basis}`")
-                st.markdown(f"Measured: `{bob_bit}`")
-
-            bases_match = alice_basis == bob_basis
-            bits_match = alice_bit == bob_bit
-
-            if bases_match:
-                kept_count += 1
-                if not bits_match:
-                    error_count += 1
-
-            with stats_col1:
-                st.metric("Qubits Sent", i + 1)
-            with stats_col2:
-                st.metric("Sifted Key", kept_count)
-            with stats_col3:
-                st.metric("Errors", error_count)
-            with stats_col4:
-                qber = error_count / kept_count if kept_count > 0 else 0
-                st.metric("QBER", f"{qber:.3f}")
+            sent_metric.metric("Qubits Sent", int(end))
+            kept_metric.metric("Sifted Key", int(kept_counts[end - 1]))
+            errors_metric.metric("Errors", int(error_counts[end - 1]))
+            qber_metric.metric("QBER", f"{qber_curve[end - 1]:.3f}")
 
             time.sleep(animation_speed)
 
-        # Complete remaining qubits
-        if n_qubits_anim > 50:
-            status_placeholder.info(
-                f"Fast-forwarding remaining {n_qubits_anim - 50} qubits..."
-            )
-            for _ in range(50, n_qubits_anim):
-                eve_intercepts_now = eve_enabled_anim and (
-                    np.random.rand() < eve_intercept_anim
-                )
-                eve_basis_now = (
-                    np.random.choice(["Z", "X"]) if eve_intercepts_now else None
-                )
-                bb84_anim.send_qubit(
-                    eve_intercepts=eve_intercepts_now, eve_basis=eve_basis_now
-                )
-
         progress_bar.empty()
         status_placeholder.empty()
 
-        final_qber, final_key_len = bb84_anim.calculate_qber()
-
         st.success("Protocol Complete")
         st.markdown("### Final Statistics")
 
@@ -210,7 +249,9 @@ if mode == "Live Animation":
                 st.success("Error rate acceptable - Channel appears secure")
 
         st.markdown("### QBER Analysis")
-        fig_gauge = BB84Visualizer.plot_qber_gauge(final_qber, threshold, "Final QBER")
+        fig_gauge = BB84Visualizer.plot_qber_gauge(
+            final_qber, threshold, "Final QBER", key=st.session_state.plot_key
+        )
         st.pyplot(fig_gauge)
 
 
@@ -234,24 +275,21 @@ elif mode == "Interactive Game":
             st.subheader("Game Settings")
             difficulty = st.selectbox(
                 "Difficulty",
-                [
-                    "Easy (15% threshold)",
-                    "Medium (12% threshold)",
-                    "Hard (10% threshold)",
-                ],
+                list(DIFFICULTY_THRESHOLDS),
+                format_func=lambda name: (
+                    f"{name} ({DIFFICULTY_THRESHOLDS[name]:.0%} threshold)"
+                ),
             )
             n_qubits = st.slider("Number of Qubits", 10, 30, 20)
 
         with col2:
             st.subheader("Difficulty Info")
-            if "Easy" in difficulty:
-                threshold = 0.15
+            threshold = DIFFICULTY_THRESHOLDS[difficulty]
+            if difficulty == "Easy":
                 st.success("More tolerance for errors")
-            elif "Hard" in difficulty:
-                threshold = 0.10
+            elif difficulty == "Hard":
                 st.error("Very low error tolerance")
             else:
-                threshold = 0.12
                 st.warning("Moderate difficulty")
 
             st.metric("QBER Threshold", f"{threshold:.0%}")
@@ -293,13 +331,17 @@ elif mode == "Interactive Game":
 
                 with col_left:
                     fig = BB84Visualizer.plot_qber_evolution(
-                        game.qber_history, game.threshold
+                        game.qber_history,
+                        game.threshold,
+                        key=st.session_state.plot_key,
                     )
                     st.pyplot(fig)
 
                 with col_right:
                     fig_gauge = BB84Visualizer.plot_qber_gauge(
-                        game.qber_history[-1], game.threshold
+                        game.qber_history[-1],
+                        game.threshold,
+                        key=st.session_state.plot_key,
                     )
                     st.pyplot(fig_gauge)
 
@@ -310,11 +352,17 @@ elif mode == "Interactive Game":
                     f"Transmission History ({stats['current_round']} rounds completed)",
                     expanded=False,
                 ):
-                    history = game.get_transmission_history()
-                    for h in history:
-                        st.markdown(
-                            f"**Round {h['round']}:** Alice ({h['alice_basis']}, {h['alice_bit']}) -> Bob ({h['bob_basis']}, {h['bob_bit']}) | {h['status']} | {h['result']}"
-                        )
+                    n_pages = game.history_pages(HISTORY_PAGE_SIZE)
+                    page = (
+                        st.number_input("Page", 1, n_pages, n_pages, key="history_page")
+                        if n_pages > 1
+                        else 1
+                    )
+                    st.dataframe(
+                        game.history_page(page - 1, HISTORY_PAGE_SIZE),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
 
             st.markdown("---")
             st.markdown("### Qubit Incoming")
@@ -403,7 +451,10 @@ elif mode == "Interactive Game":
             if len(game.qber_history) > 0:
                 st.markdown("### Game Statistics")
                 fig = BB84Visualizer.plot_game_statistics(
-                    game.qber_history, game.key_len_history, game.threshold
+                    game.qber_history,
+                    game.key_len_history,
+                    game.threshold,
+                    key=st.session_state.plot_key,
                 )
                 st.pyplot(fig)
 
@@ -419,26 +470,34 @@ elif mode == "ML Detection":
     st.header("Machine Learning Attack Detection")
 
     if st.button("Train & Test ML Detector", type="primary"):
-        with st.spinner("Training ML model on 40 BB84 sessions..."):
-            detector = MLDetector()
-            detector.train(n_sessions=20, n_qubits=40)
-            st.session_state.ml_detector = detector
-
-        st.success("Model trained")
-
-        st.markdown("### Testing Scenarios")
-
         scenarios = [
             ("No Eve", EveConfig(active=False)),
             ("Light Attack (30%)", EveConfig(active=True, intercept_rate=0.3)),
             ("Heavy Attack (80%)", EveConfig(active=True, intercept_rate=0.8)),
         ]
+        st.session_state.ml_job = get_job_manager().submit(
+            train_and_evaluate,
+            scenarios,
+            20,
+            40,
+            name="Training ML model on 40 BB84 sessions",
+            owner=st.session_state.plot_key,
+        )
+
+    job = poll_job("ml_job")
+    if job is not None and job.status == "done":
+        detector, results_df = job.result
+        st.session_state.ml_detector = detector
 
-        results_df = detector.evaluate_scenarios(scenarios, n_qubits=40)
+        st.success("Model trained")
+
+        st.markdown("### Testing Scenarios")
         st.dataframe(results_df, use_container_width=True, hide_index=True)
 
         st.markdown("### ML Confidence Levels")
-        fig = BB84Visualizer.plot_ml_confidence(results_df)
+        fig = BB84Visualizer.plot_ml_confidence(
+            results_df, key=st.session_state.plot_key
+        )
         st.pyplot(fig)
 
 
@@ -523,6 +582,31 @@ elif mode == "Tutorial":
         """
         )
 
+        if st.button("Compute Optimal Strategies", key="compute_strategies"):
+            with st.spinner("Simulating interception policies..."):
+                strategy_results = optimize_strategies(
+                    n_qubits=20, n_seeds=2000, workers=1
+                )
+
+            st.dataframe(
+                best_strategies(strategy_results)[
+                    [
+                        "Difficulty",
+                        "Rate",
+                        "QBER Cap",
+                        "Win Probability",
+                        "Expected Score",
+                        "Intercepted Fraction",
+                    ]
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+            st.caption(
+                "Eve intercepts with probability Rate while the observed QBER "
+                "stays at or below QBER Cap (20 qubits, 2000 simulated games)."
+            )
+
 
 # ANALYSIS
 elif mode == "Analysis":
@@ -543,10 +627,19 @@ elif mode == "Analysis":
         eve_rate = st.slider("Eve Intercept Rate", 0.0, 1.0, 0.5, 0.1)
 
     if st.button("Generate Analysis", type="primary"):
-        with st.spinner(f"Running {n_sessions} BB84 sessions..."):
-            df = BB84Analyzer.generate_dataset(
-                n_sessions, n_qubits_analysis, noise_level, eve_rate
-            )
+        st.session_state.analysis_job = get_job_manager().submit(
+            BB84Analyzer.generate_dataset,
+            n_sessions,
+            n_qubits_analysis,
+            noise_level,
+            eve_rate,
+            name=f"Running {n_sessions} BB84 sessions",
+            owner=st.session_state.plot_key,
+        )
+
+    job = poll_job("analysis_job")
+    if job is not None and job.status == "done":
+        df = job.result
 
         st.success(f"Generated {len(df)} sessions")
 
@@ -554,14 +647,39 @@ elif mode == "Analysis":
 
         with col1:
             st.markdown("### QBER Distribution")
-            fig = BB84Visualizer.plot_qber_distribution(df)
+            fig = BB84Visualizer.plot_qber_distribution(
+                df, key=st.session_state.plot_key
+            )
             st.pyplot(fig)
 
         with col2:
             st.markdown("### Feature Space")
-            fig = BB84Visualizer.plot_feature_space(df)
+            fig = BB84Visualizer.plot_feature_space(df, key=st.session_state.plot_key)
             st.pyplot(fig)
 
         st.markdown("### Summary Statistics")
         summary = BB84Analyzer.compute_summary_statistics(df)
         st.dataframe(summary, use_container_width=True)
+
+    st.markdown("### Parameter Estimation")
+    st.caption(
+        "Disclosed sample and abort threshold that maximize expected secret key "
+        "when the channel only has the noise above (no Eve), with at most 0.1% "
+        "chance of accepting a fully intercepted channel."
+    )
+    block_qubits = st.select_slider(
+        "Qubits per Block", [1_000, 10_000, 100_000, 1_000_000], 100_000
+    )
+    try:
+        # Eve enters through the false-accept bound, not the planned channel
+        plan = optimize_estimation(block_qubits, noise_level, intercept_rate=0.0)
+    except ValueError as e:
+        st.warning(str(e))
+    else:
+        if plan.expected_secret_bits < 1:
+            st.info(f"No setting yields secret key at QBER {plan.qber:.3f}.")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Sample Fraction", f"{plan.sample_fraction:.0%}")
+        col2.metric("Abort Threshold", f"{plan.threshold:.3f}")
+        col3.metric("Expected Secret Bits", f"{plan.expected_secret_bits:,.0f}")
+        col4.metric("Accept Probability", f"{plan.accept_probability:.1%}")
@@ -0,0 +1,297 @@
+# %%
+import os
+
+import numpy as np
+import pandas as pd
+
+from bb84_protocol import EveConfig, SessionRounds, simulate_session
+
+# file layout:
+#   header (64 bytes) | index (index_capacity x INDEX_DTYPE) | session data ...
+# each session stores COLUMNS back to back, every column bit-packed to
+# ceil(n_rounds / 8) bytes. Sessions are only ever appended; the header's
+# n_sessions is written last so a torn append is simply not visible.
+MAGIC = b"BB84ARC1"
+VERSION = 1
+HEADER_BYTES = 64
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("n_columns", "<u4"),
+        ("index_capacity", "<u8"),
+        ("n_sessions", "<u8"),
+        ("data_end", "<u8"),
+    ]
+)
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("n_rounds", "<u8"),
+        ("sifted", "<u8"),
+        ("errors", "<u8"),
+        ("intercepted", "<u8"),
+        ("noise_prob", "<f4"),
+        ("eve_rate", "<f4"),
+    ]
+)
+COLUMNS = (
+    "alice_bits",
+    "alice_bases",
+    "bob_bases",
+    "bob_bits",
+    "eve_mask",
+    "eve_bases",
+    "eve_bits",
+)
+
+
+def packed_bytes(n_rounds):
+    return (n_rounds + 7) // 8
+
+
+def packed_qber(block, n_rounds):
+    # block: (..., len(COLUMNS), nbytes) packed session columns; only the first
+    # n_rounds rounds are counted, so this also replays truncated sessions
+    nbytes = packed_bytes(n_rounds)
+    col = {name: block[..., i, :nbytes] for i, name in enumerate(COLUMNS)}
+
+    matching = ~(col["alice_bases"] ^ col["bob_bases"])
+    if n_rounds % 8:
+        # bits are packed big-endian, drop the tail of the last byte
+        matching[..., -1] &= np.uint8((0xFF << (8 - n_rounds % 8)) & 0xFF)
+    errors = (col["alice_bits"] ^ col["bob_bits"]) & matching
+    sifted = np.bitwise_count(matching).sum(axis=-1, dtype=np.int64)
+    n_errors = np.bitwise_count(errors).sum(axis=-1, dtype=np.int64)
+    return n_errors, sifted
+
+
+def _pack(rounds):
+    # (k, n) session rounds -> (k, len(COLUMNS), nbytes) packed bytes
+    columns = [np.asarray(getattr(rounds, name), dtype=np.uint8) for name in COLUMNS]
+    # one bit per round and column: a six-state Y basis (2) would be stored as X
+    if any(col.max(initial=0) > 1 for col in columns):
+        raise ValueError("SessionArchive stores two-basis (BB84) rounds only")
+    return np.stack([np.packbits(col, axis=-1) for col in columns], axis=-2)
+
+
+class SessionArchive:
+
+    def __init__(self, path):
+        self.path = path
+        self.refresh()
+
+    @classmethod
+    def create(cls, path, index_capacity=1 << 20):
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["n_columns"] = len(COLUMNS)
+        header["index_capacity"] = index_capacity
+        header["data_end"] = HEADER_BYTES + index_capacity * INDEX_DTYPE.itemsize
+
+        with open(path, "wb") as f:
+            f.write(header.tobytes().ljust(HEADER_BYTES, b"\0"))
+            f.truncate(int(header["data_end"]))
+        return cls(path)
+
+    def refresh(self):
+        # re-map the file to pick up sessions appended since opening
+        header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"Not a BB84 session archive: {self.path}")
+        if header["version"][0] != VERSION:
+            raise ValueError(f"Unsupported archive version: {header['version'][0]}")
+
+        self.header = header[0]
+        self.n_sessions = int(self.header["n_sessions"])
+        self.index_capacity = int(self.header["index_capacity"])
+        self.data_start = HEADER_BYTES + self.index_capacity * INDEX_DTYPE.itemsize
+
+        self.mm = np.memmap(self.path, dtype=np.uint8, mode="r")
+        self.index = self.mm[
+            HEADER_BYTES : HEADER_BYTES + self.n_sessions * INDEX_DTYPE.itemsize
+        ].view(INDEX_DTYPE)
+
+    def __len__(self):
+        return self.n_sessions
+
+    def append(self, rounds, noise_prob=0.0, eve_rate=0.0):
+        # rounds: SessionRounds for one session (1-D) or a batch (2-D)
+        packed = _pack(rounds)
+        if packed.ndim == 2:
+            packed = packed[None]
+        k, _, nbytes = packed.shape
+        n_rounds = rounds.n_qubits
+
+        qber_errors, sifted = packed_qber(packed, n_rounds)
+        intercepted = np.asarray(rounds.eve_mask).reshape(k, -1).sum(axis=1)
+
+        with open(self.path, "r+b") as f:
+            header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)
+            header = header.copy()[0]
+            n_sessions = int(header["n_sessions"])
+            if n_sessions + k > int(header["index_capacity"]):
+                raise ValueError("Archive index is full")
+
+            data_end = int(header["data_end"])
+            session_bytes = len(COLUMNS) * nbytes
+
+            records = np.zeros(k, dtype=INDEX_DTYPE)
+            records["offset"] = data_end + np.arange(k) * session_bytes
+            records["n_rounds"] = n_rounds
+            records["sifted"] = sifted
+            records["errors"] = qber_errors
+            records["intercepted"] = intercepted
+            records["noise_prob"] = noise_prob
+            records["eve_rate"] = eve_rate
+
+            f.seek(data_end)
+            f.write(packed.tobytes())
+            f.seek(HEADER_BYTES + n_sessions * INDEX_DTYPE.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+
+            header["n_sessions"] = n_sessions + k
+            header["data_end"] = data_end + k * session_bytes
+            f.seek(0)
+            f.write(header.tobytes())
+
+        self.refresh()
+        return n_sessions
+
+    def append_protocol(self, protocol, noise_prob=0.0, eve_rate=0.0):
+        return self.append(protocol.session_rounds(), noise_prob, eve_rate)
+
+    def packed(self, i):
+        # zero-copy (len(COLUMNS), nbytes) view of session i
+        rec = self.index[i]
+        nbytes = packed_bytes(int(rec["n_rounds"]))
+        start = int(rec["offset"])
+        return self.mm[start : start + len(COLUMNS) * nbytes].reshape(
+            len(COLUMNS), nbytes
+        )
+
+    def packed_block(self, start, stop):
+        # zero-copy (k, len(COLUMNS), nbytes) view of sessions [start, stop) when
+        # they share a length and are stored back to back, otherwise None
+        index = self.index[start:stop]
+        if len(index) == 0:
+            return None
+        n_rounds = index["n_rounds"]
+        if (n_rounds != n_rounds[0]).any():
+            return None
+
+        session_bytes = len(COLUMNS) * packed_bytes(int(n_rounds[0]))
+        if (np.diff(index["offset"].astype(np.int64)) != session_bytes).any():
+            return None
+
+        first = int(index["offset"][0])
+        return self.mm[first : first + len(index) * session_bytes].reshape(
+            len(index), len(COLUMNS), session_bytes // len(COLUMNS)
+        )
+
+    def session(self, i):
+        n_rounds = int(self.index[i]["n_rounds"])
+        columns = np.unpackbits(self.packed(i), axis=-1, count=n_rounds)
+        fields = dict(zip(COLUMNS, columns))
+        fields["eve_mask"] = fields["eve_mask"].astype(bool)
+        return SessionRounds(**fields)
+
+    def summary(self):
+        index = self.index
+        sifted = index["sifted"].astype(np.int64)
+        qber = np.divide(
+            index["errors"],
+            sifted,
+            out=np.zeros(len(index)),
+            where=sifted > 0,
+        )
+        return pd.DataFrame(
+            {
+                "QBER": qber,
+                "Key Length": sifted,
+                "Sift Ratio": sifted / np.maximum(index["n_rounds"], 1),
+                "Eve Present": np.where(index["eve_rate"] > 0, "Yes", "No"),
+                "Noise": index["noise_prob"],
+                "Eve Rate": index["eve_rate"],
+                "Intercepted": index["intercepted"].astype(np.int64),
+            }
+        )
+
+
+def record_sessions(
+    path,
+    n_sessions,
+    n_qubits,
+    eve_config=None,
+    noise_prob=0.0,
+    batch_size=4096,
+    rng=None,
+    index_capacity=None,
+):
+    if rng is None:
+        rng = np.random.default_rng()
+    if eve_config is None:
+        eve_config = EveConfig(active=False)
+
+    if os.path.exists(path):
+        archive = SessionArchive(path)
+    else:
+        archive = SessionArchive.create(
+            path, index_capacity or max(n_sessions, 1 << 20)
+        )
+
+    eve_rate = eve_config.intercept_rate if eve_config.active else 0.0
+    for start in range(0, n_sessions, batch_size):
+        k = min(batch_size, n_sessions - start)
+        rounds = simulate_session(n_qubits, eve_config, noise_prob, rng, n_sessions=k)
+        archive.append(rounds, noise_prob, eve_rate)
+
+    return archive
+
+
+# %%
+if __name__ == "__main__":
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    eve = EveConfig(active=True, intercept_rate=0.5)
+
+    # packed QBER matches the unpacked rounds, including lengths that leave
+    # a partial last byte, and for truncated replays of a longer session
+    for n_rounds in (1, 7, 8, 9, 13, 100, 1001):
+        rounds = simulate_session(n_rounds, eve, 0.05, rng)
+        n_errors, sifted = packed_qber(_pack(rounds), n_rounds)
+        qber, expected = rounds.qber()
+        assert sifted == expected
+        assert np.isclose(n_errors / max(sifted, 1), qber)
+
+    rounds = simulate_session(1001, eve, 0.05, rng)
+    for n_rounds in (5, 12, 999):
+        head = SessionRounds(
+            **{name: getattr(rounds, name)[:n_rounds] for name in COLUMNS}
+        )
+        n_errors, sifted = packed_qber(_pack(rounds), n_rounds)
+        qber, expected = head.qber()
+        assert sifted == expected
+        assert np.isclose(n_errors / max(sifted, 1), qber)
+
+    # round trip through the file
+    path = os.path.join(tempfile.mkdtemp(), "sessions.bb84")
+    archive = record_sessions(path, 50, 37, eve, 0.02, batch_size=16, rng=rng)
+    for i in (0, 17, 49):
+        qber, sifted = archive.session(i).qber()
+        rec = archive.index[i]
+        assert rec["sifted"] == sifted
+        assert np.isclose(rec["errors"] / max(sifted, 1), qber)
+
+    # a third basis does not fit in one bit per round
+    try:
+        _pack(simulate_session(16, rng=rng, n_bases=3))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("six-state rounds were packed")
+
+    print("archive checks passed")
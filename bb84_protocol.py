@@ -19,17 +19,141 @@ class EveConfig:
     intercept_rate: float = 1.0
 
 
+# basis index -> label, 0 = Z and 1 = X everywhere in the vectorized engine
+BASES = np.array(["Z", "X"])
+
+
+@dataclass
+class SessionRounds:
+    alice_bits: np.ndarray
+    alice_bases: np.ndarray
+    bob_bases: np.ndarray
+    bob_bits: np.ndarray
+    eve_mask: np.ndarray
+    eve_bases: np.ndarray
+    eve_bits: np.ndarray
+
+    @property
+    def n_qubits(self):
+        return self.alice_bits.shape[-1]
+
+    def sift_mask(self):
+        return self.alice_bases == self.bob_bases
+
+    def sifted_key(self):
+        return self.alice_bits[self.sift_mask()]
+
+    def qber(self):
+        # same result as calculate_qber, along the last axis
+        matching = self.sift_mask()
+        sifted = matching.sum(axis=-1)
+        errors = ((self.alice_bits != self.bob_bits) & matching).sum(axis=-1)
+        qber = np.divide(
+            errors, sifted, out=np.zeros(np.shape(sifted)), where=sifted > 0
+        )
+        return qber, sifted
+
+
+def measure_states(state_bases, state_bits, meas_bases, rng):
+    # analytic measure_qubit for basis eigenstates: the same basis returns the
+    # encoded bit, a conjugate basis gives a fair coin (drawn for those rounds
+    # only, so a bit source is charged just for the coins it supplies)
+    wrong = state_bases != meas_bases
+    out = np.array(np.broadcast_to(state_bits, wrong.shape), dtype=np.uint8)
+    out[wrong] = rng.integers(0, 2, size=np.count_nonzero(wrong), dtype=np.uint8)
+    return out
+
+
+def simulate_rounds(
+    alice_bits,
+    alice_bases,
+    bob_bases,
+    eve_config=None,
+    noise_prob=0.0,
+    rng=None,
+    n_bases=2,
+    eve_rng=None,
+):
+    # eve_rng draws Eve's decisions, bases and outcomes (e.g. a bit source view
+    # charged to her); it defaults to rng, which keeps the draw order
+    if rng is None:
+        rng = np.random.default_rng()
+    if eve_rng is None:
+        eve_rng = rng
+    if eve_config is None:
+        eve_config = EveConfig(active=False)
+
+    shape = np.shape(alice_bits)
+    eve_mask = np.zeros(shape, dtype=bool)
+    eve_bases = np.zeros(shape, dtype=np.uint8)
+    eve_bits = np.zeros(shape, dtype=np.uint8)
+    if eve_config.active:
+        # intercept-resend: Eve measures and re-prepares in her own basis; she
+        # draws nothing for the rounds she lets through
+        eve_mask = eve_rng.random(shape) < eve_config.intercept_rate
+        n_intercepted = np.count_nonzero(eve_mask)
+        eve_bases[eve_mask] = eve_rng.integers(
+            0, n_bases, size=n_intercepted, dtype=np.uint8
+        )
+        eve_bits[eve_mask] = measure_states(
+            np.asarray(alice_bases)[eve_mask],
+            np.asarray(alice_bits)[eve_mask],
+            eve_bases[eve_mask],
+            eve_rng,
+        )
+    channel_bases = np.where(eve_mask, eve_bases, alice_bases)
+    channel_bits = np.where(eve_mask, eve_bits, alice_bits)
+
+    bob_bits = measure_states(channel_bases, channel_bits, bob_bases, rng)
+    if noise_prob > 0:
+        bob_bits ^= (rng.random(shape) < noise_prob).astype(np.uint8)
+
+    return SessionRounds(
+        alice_bits=np.asarray(alice_bits, dtype=np.uint8),
+        alice_bases=np.asarray(alice_bases, dtype=np.uint8),
+        bob_bases=np.asarray(bob_bases, dtype=np.uint8),
+        bob_bits=bob_bits,
+        eve_mask=eve_mask,
+        eve_bases=eve_bases,
+        eve_bits=eve_bits,
+    )
+
+
+def simulate_session(
+    n_qubits, eve_config=None, noise_prob=0.0, rng=None, n_sessions=None, n_bases=2
+):
+    # n_sessions stacks independent sessions along the first axis; n_bases=3
+    # adds Y for the six-state protocol, all bases mutually unbiased
+    if rng is None:
+        rng = np.random.default_rng()
+    shape = n_qubits if n_sessions is None else (n_sessions, n_qubits)
+
+    alice_bits = rng.integers(0, 2, size=shape, dtype=np.uint8)
+    alice_bases = rng.integers(0, n_bases, size=shape, dtype=np.uint8)
+    bob_bases = rng.integers(0, n_bases, size=shape, dtype=np.uint8)
+    return simulate_rounds(
+        alice_bits, alice_bases, bob_bases, eve_config, noise_prob, rng, n_bases
+    )
+
+
 class BB84Protocol:
-    def __init__(self, n_qubits=20):
+    def __init__(self, n_qubits=20, source=None):
         self.n_qubits = n_qubits
         self.simulator = SIMULATOR
+        # optional randomness.BitSource; the global numpy state otherwise
+        self.source = source
         self.reset()
 
     def reset(self):
         # New protocol session
-        self.alice_bits = np.random.randint(0, 2, self.n_qubits)
-        self.alice_bases = np.random.choice(["Z", "X"], self.n_qubits)
-        self.bob_bases = np.random.choice(["Z", "X"], self.n_qubits)
+        if self.source is None:
+            self.alice_bits = np.random.randint(0, 2, self.n_qubits)
+            self.alice_bases = np.random.choice(["Z", "X"], self.n_qubits)
+            self.bob_bases = np.random.choice(["Z", "X"], self.n_qubits)
+        else:
+            self.alice_bits = self.source.bits(self.n_qubits, "alice")
+            self.alice_bases = BASES[self.source.bits(self.n_qubits, "alice")]
+            self.bob_bases = BASES[self.source.bits(self.n_qubits, "bob")]
         self.bob_bits = []
         self.eve_interceptions = []
         self.current_round = 0
@@ -40,12 +164,18 @@ class BB84Protocol:
             qc.x(0) # not gate
         if basis == "X":
             qc.h(0) # hadamard to change basis
+        elif basis == "Y":
+            qc.h(0)
+            qc.s(0)
         return qc
 
     def measure_qubit(self, qc, basis):
         qc_copy = qc.copy() # copy not to disturb the original
         if basis == "X":
             qc_copy.h(0)
+        elif basis == "Y":
+            qc_copy.sdg(0)
+            qc_copy.h(0)
         qc_copy.measure(0, 0)
 
         qc_transpiled = transpile(qc_copy, self.simulator)
@@ -94,42 +224,113 @@ class BB84Protocol:
         qber = errors / len(alice_sifted)
         return qber, len(alice_sifted)
 
-    def run_session(self, eve_config=None, noise_prob=0.0):
+    def session_rounds(self):
+        # rounds played so far as vectorized-engine arrays
+        n = self.current_round
+        eve_mask = np.array([e is not None for e in self.eve_interceptions[:n]])
+        eve_bases = np.zeros(n, dtype=np.uint8)
+        eve_bits = np.zeros(n, dtype=np.uint8)
+        for i, e in enumerate(self.eve_interceptions[:n]):
+            if e is not None:
+                eve_bases[i] = e["eve_basis"] == "X"
+                eve_bits[i] = e["eve_bit"]
+
+        return SessionRounds(
+            alice_bits=self.alice_bits[:n].astype(np.uint8),
+            alice_bases=(self.alice_bases[:n] == "X").astype(np.uint8),
+            bob_bases=(self.bob_bases[:n] == "X").astype(np.uint8),
+            bob_bits=np.array(self.bob_bits[:n], dtype=np.uint8),
+            eve_mask=eve_mask.astype(bool).reshape(n),
+            eve_bases=eve_bases,
+            eve_bits=eve_bits,
+        )
+
+    def run_session(self, eve_config=None, noise_prob=0.0, engine="qiskit", rng=None):
         if eve_config is None:
             eve_config = EveConfig(active=False)
 
+        if engine == "vectorized":
+            return self._run_session_vectorized(eve_config, noise_prob, rng)
+        if engine != "qiskit":
+            raise ValueError(f"Unknown engine: {engine}")
+
+        # wrong-basis outcomes come from the circuit simulator itself
         for i in range(self.n_qubits):
             eve_intercepts = eve_config.active and (
-                np.random.rand() < eve_config.intercept_rate
+                self._uniform("eve") < eve_config.intercept_rate
             )
-            eve_basis = np.random.choice(["Z", "X"]) if eve_intercepts else None
+            eve_basis = self._basis("eve") if eve_intercepts else None
             self.send_qubit(eve_intercepts=eve_intercepts, eve_basis=eve_basis)
 
-            if np.random.rand() < noise_prob:
+            if self._uniform("channel") < noise_prob:
                 self.bob_bits[-1] ^= 1
 
         return self.calculate_qber()
 
-# %%
+    def _uniform(self, consumer):
+        if self.source is None:
+            return np.random.rand()
+        return self.source.uniform(1, consumer)[0]
 
-protocol = BB84Protocol(n_qubits=50)
+    def _basis(self, consumer):
+        if self.source is None:
+            return np.random.choice(["Z", "X"])
+        return BASES[self.source.bits(1, consumer)[0]]
 
-# No Eve, no noise, qber 0
-qber_no_eve, sifted_len_no_eve = protocol.run_session()
-print(f"sifted bits: {sifted_len_no_eve}, qber: {qber_no_eve:.2%}")
+    def _run_session_vectorized(self, eve_config, noise_prob, rng):
+        # with a bit source, Eve's draws are charged to her and the
+        # measurement coins and noise to the channel; it takes precedence
+        # over rng like it does in reset
+        eve_rng = None
+        if self.source is not None:
+            rng, eve_rng = self.source.view("channel"), self.source.view("eve")
+        start = self.current_round
+        rounds = simulate_rounds(
+            self.alice_bits[start:],
+            (self.alice_bases[start:] == "X").astype(np.uint8),
+            (self.bob_bases[start:] == "X").astype(np.uint8),
+            eve_config,
+            noise_prob,
+            rng,
+            eve_rng=eve_rng,
+        )
 
-# All qubits intercepted
-protocol.reset()
-qber_with_eve, sifted_len_with_eve = protocol.run_session(
-    eve_config=EveConfig(active=True, intercept_rate=1.0)
-)
-print(f"\nintercepting all qubits:")
-print(f"  sifted bits: {sifted_len_with_eve}, qber: {qber_with_eve:.2%}")
+        self.bob_bits.extend(rounds.bob_bits.tolist())
+        eve_bases = BASES[rounds.eve_bases]
+        for i in range(len(rounds.eve_mask)):
+            if rounds.eve_mask[i]:
+                self.eve_interceptions.append(
+                    {
+                        "round": start + i,
+                        "eve_basis": eve_bases[i],
+                        "eve_bit": int(rounds.eve_bits[i]),
+                    }
+                )
+            else:
+                self.eve_interceptions.append(None)
+        self.current_round = self.n_qubits
+
+        return self.calculate_qber()
 
-# expecting higher qber with evesdropper
-if qber_with_eve > qber_no_eve:
-    print("pass")
-else:
-    print("fail")
 
 # %%
+if __name__ == "__main__":
+    protocol = BB84Protocol(n_qubits=50)
+
+    # No Eve, no noise, qber 0
+    qber_no_eve, sifted_len_no_eve = protocol.run_session()
+    print(f"sifted bits: {sifted_len_no_eve}, qber: {qber_no_eve:.2%}")
+
+    # All qubits intercepted
+    protocol.reset()
+    qber_with_eve, sifted_len_with_eve = protocol.run_session(
+        eve_config=EveConfig(active=True, intercept_rate=1.0)
+    )
+    print(f"\nintercepting all qubits:")
+    print(f"  sifted bits: {sifted_len_with_eve}, qber: {qber_with_eve:.2%}")
+
+    # expecting higher qber with evesdropper
+    if qber_with_eve > qber_no_eve:
+        print("pass")
+    else:
+        print("fail")
@@ -0,0 +1,265 @@
+# %%
+import queue
+import socket
+import struct
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+from bb84_protocol import BB84Protocol
+from protocols import BB84
+
+# message kinds on the public channel
+MSG_BASES, MSG_SIFT_MASK, MSG_SAMPLE, MSG_PARITIES, MSG_VERDICT = range(5)
+KIND_NAMES = ["bases", "sift_mask", "sample", "parities", "verdict"]
+
+# kind (uint8), flags (uint8), number of elements (uint32), payload bytes (uint32)
+HEADER = struct.Struct("!BBII")
+PACKED, COMPRESSED = 1, 2
+
+
+def encode(kind, values, compact=True):
+    # bit arrays are packed 8 per byte and zlib-compressed when that is
+    # smaller; compact=False sends one byte per value as a baseline
+    values = np.asarray(values, dtype=np.uint8)
+    flags = 0
+    payload = values.tobytes()
+    if compact:
+        payload = np.packbits(values).tobytes()
+        flags |= PACKED
+        squeezed = zlib.compress(payload, 6)
+        if len(squeezed) < len(payload):
+            payload = squeezed
+            flags |= COMPRESSED
+    return HEADER.pack(kind, flags, len(values), len(payload)) + payload
+
+
+def decode(frame):
+    kind, flags, n, size = HEADER.unpack_from(frame)
+    payload = frame[HEADER.size : HEADER.size + size]
+    if flags & COMPRESSED:
+        payload = zlib.decompress(payload)
+    values = np.frombuffer(payload, dtype=np.uint8)
+    if flags & PACKED:
+        values = np.unpackbits(values, count=n)
+    return kind, values
+
+
+class LocalTransport:
+    # in-process queues, one per direction
+
+    def __init__(self):
+        self.queues = {"alice": deque(), "bob": deque()}
+
+    def send(self, sender, frame):
+        receiver = "bob" if sender == "alice" else "alice"
+        self.queues[receiver].append(frame)
+
+    def recv(self, receiver):
+        return self.queues[receiver].popleft()
+
+    def close(self):
+        pass
+
+
+class SocketTransport:
+    # loopback socketpair with length-prefixed frames; a reader thread per end
+    # drains the socket so a large send never blocks on the other end's recv
+
+    def __init__(self):
+        alice, bob = socket.socketpair()
+        self.sockets = {"alice": alice, "bob": bob}
+        self.inboxes = {"alice": queue.Queue(), "bob": queue.Queue()}
+        self.readers = [
+            threading.Thread(target=self._read, args=(name,), daemon=True)
+            for name in self.sockets
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def _read_exact(self, sock, n):
+        chunks = []
+        while n:
+            chunk = sock.recv(min(n, 1 << 20))
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b"".join(chunks)
+
+    def _read(self, name):
+        sock = self.sockets[name]
+        while True:
+            size = self._read_exact(sock, 4)
+            if size is None:
+                return
+            frame = self._read_exact(sock, struct.unpack("!I", size)[0])
+            if frame is None:
+                return
+            self.inboxes[name].put(frame)
+
+    def send(self, sender, frame):
+        self.sockets[sender].sendall(struct.pack("!I", len(frame)) + frame)
+
+    def recv(self, receiver, timeout=10.0):
+        return self.inboxes[receiver].get(timeout=timeout)
+
+    def close(self):
+        for sock in self.sockets.values():
+            sock.close()
+
+
+class ClassicalChannel:
+    # public channel between Alice and Bob with byte, message and round-trip
+    # accounting; a round trip is counted each time the direction of traffic
+    # turns around. Messages are not authenticated here: subclasses add that
+    # through _seal/_open (see auth.AuthenticatedChannel)
+
+    def __init__(self, transport=None, compact=True):
+        self.transport = transport or LocalTransport()
+        self.compact = compact
+        self.bytes_sent = {"alice": 0, "bob": 0}
+        self.bytes_by_kind = dict.fromkeys(KIND_NAMES, 0)
+        self.messages = 0
+        self.turns = 0
+        self._last_sender = None
+
+    def send(self, sender, kind, values):
+        frame = self._seal(sender, encode(kind, values, self.compact))
+        self.transport.send(sender, frame)
+        self.bytes_sent[sender] += len(frame)
+        self.bytes_by_kind[KIND_NAMES[kind]] += len(frame)
+        self.messages += 1
+        if sender != self._last_sender:
+            self.turns += 1
+            self._last_sender = sender
+
+    def recv(self, receiver, expected):
+        kind, values = decode(self._open(receiver, self.transport.recv(receiver)))
+        if kind != expected:
+            raise ValueError(
+                f"Expected {KIND_NAMES[expected]} message, got {KIND_NAMES[kind]}"
+            )
+        return values
+
+    def _seal(self, sender, frame):
+        # hooks for wrapping frames on the wire, e.g. authentication tags
+        return frame
+
+    def _open(self, receiver, frame):
+        return frame
+
+    @property
+    def round_trips(self):
+        return self.turns / 2
+
+    @property
+    def total_bytes(self):
+        return sum(self.bytes_sent.values())
+
+    def close(self):
+        self.transport.close()
+
+
+def _block_parities(bits, block_size):
+    padded = np.zeros(-(-len(bits) // block_size) * block_size, dtype=np.uint8)
+    padded[: len(bits)] = bits
+    return np.bitwise_xor.reduce(padded.reshape(-1, block_size), axis=1)
+
+
+def post_process(
+    session,
+    channel=None,
+    sample_fraction=0.1,
+    threshold=0.11,
+    parity_block=64,
+    rng=None,
+):
+    # sifting, QBER sampling and one parity pass over the public channel,
+    # instead of comparing Alice's and Bob's arrays in memory
+    if rng is None:
+        rng = np.random.default_rng()
+    if channel is None:
+        channel = ClassicalChannel()
+    rounds = session.session_rounds() if isinstance(session, BB84Protocol) else session
+    # bases travel as packed single bits, so a third basis would be misread
+    if rounds.alice_bases.max(initial=0) > 1 or rounds.bob_bases.max(initial=0) > 1:
+        raise ValueError("post_process supports two-basis (BB84) rounds only")
+
+    # Bob announces his bases, Alice answers with the positions that match
+    channel.send("bob", MSG_BASES, rounds.bob_bases)
+    bob_bases = channel.recv("alice", MSG_BASES)
+    match = (rounds.alice_bases == bob_bases).astype(np.uint8)
+    channel.send("alice", MSG_SIFT_MASK, match)
+    match = channel.recv("bob", MSG_SIFT_MASK).astype(bool)
+
+    alice_key = rounds.alice_bits[match]
+    bob_key = rounds.bob_bits[match]
+
+    # Alice discloses a random sample of her sifted bits, Bob returns the
+    # verdict (errors found) and both drop the sample from the key
+    sample = (rng.random(len(alice_key)) < sample_fraction).astype(np.uint8)
+    channel.send("alice", MSG_SAMPLE, np.concatenate([sample, alice_key[sample == 1]]))
+    message = channel.recv("bob", MSG_SAMPLE)
+    sample_mask = message[: len(bob_key)].astype(bool)
+    errors = int((message[len(bob_key) :] != bob_key[sample_mask]).sum())
+    # every message is a bit array, so the error count goes as 32 bits
+    verdict = np.unpackbits(np.frombuffer(struct.pack("!I", errors), np.uint8))
+    channel.send("bob", MSG_VERDICT, verdict)
+    reply = channel.recv("alice", MSG_VERDICT)
+    errors = struct.unpack("!I", np.packbits(reply).tobytes())[0]
+    n_sample = int(sample_mask.sum())
+    qber = errors / n_sample if n_sample else 0.0
+
+    alice_key, bob_key = alice_key[~sample_mask], bob_key[~sample_mask]
+    aborted = qber > threshold
+
+    # one pass of block parities, the traffic pattern reconciliation starts with
+    mismatched = 0
+    if not aborted and len(alice_key):
+        channel.send("alice", MSG_PARITIES, _block_parities(alice_key, parity_block))
+        parities = channel.recv("bob", MSG_PARITIES)
+        mismatched = int((parities != _block_parities(bob_key, parity_block)).sum())
+
+    secret_bits = 0 if aborted else int(BB84.secret_fraction(qber) * len(alice_key))
+    return {
+        "Qubits": rounds.n_qubits,
+        "Sifted": int(match.sum()),
+        "Sample": n_sample,
+        "QBER": qber,
+        "Aborted": aborted,
+        "Key Bits": len(alice_key),
+        "Mismatched Blocks": mismatched,
+        "Secret Bits": secret_bits,
+        "Bytes": channel.total_bytes,
+        "Messages": channel.messages,
+        "Round Trips": channel.round_trips,
+        "Bytes per Secret Bit": (
+            channel.total_bytes / secret_bits if secret_bits else float("inf")
+        ),
+        "Round Trips per Secret Bit": (
+            channel.round_trips / secret_bits if secret_bits else float("inf")
+        ),
+    }
+
+
+# %%
+if __name__ == "__main__":
+    from bb84_protocol import simulate_session
+
+    rounds = simulate_session(200_000, noise_prob=0.02, rng=np.random.default_rng(0))
+    for label, transport, compact in [
+        ("local, raw", LocalTransport(), False),
+        ("local, packed", LocalTransport(), True),
+        ("socket, packed", SocketTransport(), True),
+    ]:
+        channel = ClassicalChannel(transport, compact)
+        stats = post_process(rounds, channel, rng=np.random.default_rng(1))
+        channel.close()
+        print(
+            f"{label:15s} {stats['Bytes']:>8d} bytes, {stats['Round Trips']} RTT, "
+            f"{stats['Bytes per Secret Bit']:.3f} B/secret bit, "
+            f"by kind {channel.bytes_by_kind}"
+        )
@@ -0,0 +1,197 @@
+# %%
+import argparse
+import json
+from multiprocessing import get_context
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from analyzer import BB84Analyzer
+from bb84_protocol import EveConfig
+from export import PARTITION_BY, ChunkedWriter
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+def load_scenarios(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML scenario files")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if not spec or not spec.get("scenarios"):
+        raise ValueError(f"No scenarios defined in {path}")
+
+    defaults = {
+        "n_qubits": spec.get("n_qubits", 50),
+        "replicates": spec.get("replicates", 1),
+        "engine": spec.get("engine", "vectorized"),
+        "threshold": spec.get("threshold", 0.11),
+    }
+    scenarios = []
+    for i, entry in enumerate(spec["scenarios"]):
+        eve = entry.get("eve") or {}
+        scenarios.append(
+            {
+                **defaults,
+                **{k: entry[k] for k in defaults if k in entry},
+                "name": entry.get("name", f"scenario-{i}"),
+                "noise": float(entry.get("noise", 0.0)),
+                "eve": EveConfig(
+                    active=bool(eve.get("active", False)),
+                    intercept_rate=float(eve.get("intercept_rate", 1.0)),
+                ),
+            }
+        )
+    return scenarios, spec.get("seed")
+
+
+def run_batch(scenario, n_sessions, seed):
+    # BB84Protocol.reset still draws from the global generator
+    np.random.seed(seed.generate_state(1)[0])
+    rng = np.random.default_rng(seed)
+
+    df = BB84Analyzer.test_scenarios(
+        [(scenario["name"], scenario["eve"], scenario["noise"])] * n_sessions,
+        scenario["n_qubits"],
+        engine=scenario["engine"],
+        formatted=False,
+        threshold=scenario["threshold"],
+        rng=rng,
+    )
+    df["Noise"] = scenario["noise"]
+    df["Eve Rate"] = scenario["eve"].intercept_rate if scenario["eve"].active else 0.0
+    df["Qubits"] = scenario["n_qubits"]
+    df["Engine"] = scenario["engine"]
+    return df
+
+
+def run_scenarios(
+    scenarios, workers=None, batch_size=100, seed=None, log=sys.stderr, on_batch=None
+):
+    # Returns every session row. With on_batch (e.g. a ChunkedWriter streaming
+    # results to disk) each finished batch is handed over and dropped, and
+    # only its batch_totals rows are kept, so memory stays O(batches).
+    tasks = []
+    for scenario in scenarios:
+        for start in range(0, scenario["replicates"], batch_size):
+            tasks.append((scenario, min(batch_size, scenario["replicates"] - start)))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+
+    total = sum(n for _, n in tasks)
+    done = 0
+    started = time.perf_counter()
+    frames = []
+
+    # spawn rather than fork: the parent already holds an AerSimulator with its
+    # own threads, which a forked child would inherit in an undefined state.
+    # Workers only pay for a plain import, since no module simulates at import.
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        futures = {
+            pool.submit(run_batch, scenario, n, s): n
+            for (scenario, n), s in zip(tasks, seeds)
+        }
+        for future in as_completed(futures):
+            df = future.result()
+            if on_batch is None:
+                frames.append(df)
+            else:
+                on_batch(df)
+                frames.append(batch_totals(df))
+            done += futures[future]
+            elapsed = time.perf_counter() - started
+            print(
+                f"[{done}/{total}] {df['Scenario'].iloc[0]}: "
+                f"{done / elapsed:.1f} sessions/s",
+                file=log,
+                flush=True,
+            )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def batch_totals(df):
+    # per-scenario sums that add up across batches
+    return (
+        df.assign(**{"High Risk": df["Detection"] == "High risk"})
+        .groupby("Scenario", sort=False)
+        .agg(
+            Sessions=("QBER", "size"),
+            QBER=("QBER", "sum"),
+            KeyLength=("Key Length", "sum"),
+            HighRisk=("High Risk", "sum"),
+        )
+        .reset_index()
+    )
+
+
+def summarize(totals):
+    totals = totals.groupby("Scenario", sort=False).sum()
+    means = totals[["QBER", "KeyLength", "HighRisk"]].div(totals["Sessions"], axis=0)
+    return pd.concat([totals[["Sessions"]], means], axis=1)
+
+
+def write_results(df, path):
+    if path.endswith(".parquet"):
+        with ChunkedWriter(path) as writer:
+            writer.write(df)
+    elif path.endswith(".json"):
+        df.to_json(path, orient="records", indent=1)
+    elif path.endswith(".jsonl"):
+        df.to_json(path, orient="records", lines=True)
+    else:
+        raise ValueError(f"Unsupported output format: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run BB84 scenario sweeps without the Streamlit app."
+    )
+    parser.add_argument("scenario_file", help="YAML or JSON scenario file")
+    parser.add_argument(
+        "-o", "--output", default="results.parquet", help=".parquet, .json or .jsonl"
+    )
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help="write a Parquet dataset directory partitioned by scenario and date",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("-b", "--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    scenarios, file_seed = load_scenarios(args.scenario_file)
+    seed = args.seed if args.seed is not None else file_seed
+
+    if args.partition or args.output.endswith(".parquet"):
+        # typed columns, written batch by batch as workers finish
+        partition_by = PARTITION_BY if args.partition else None
+        with ChunkedWriter(args.output, partition_by) as writer:
+            totals = run_scenarios(
+                scenarios, args.workers, args.batch_size, seed, on_batch=writer.write
+            )
+    else:
+        df = run_scenarios(scenarios, args.workers, args.batch_size, seed)
+        write_results(df, args.output)
+        totals = batch_totals(df)
+
+    summary = summarize(totals)
+    print(summary.round(4).to_string(), file=sys.stderr)
+    print(
+        f"Wrote {summary['Sessions'].sum()} sessions to {args.output}", file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# %%
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+
+from bb84_protocol import SIMULATOR, EveConfig
+
+# measurement angles in the x-z plane of the Bloch sphere, where the pair
+# |Phi+> gives the correlation E(a, b) = cos(theta_a - theta_b)
+E91_ALICE_ANGLES = np.array([0.0, np.pi / 2])
+E91_BOB_ANGLES = np.array([0.0, np.pi / 4, -np.pi / 4])
+# BBM92 is BB84 on pairs: both sides pick Z (0) or X (pi/2)
+BBM92_ANGLES = np.array([0.0, np.pi / 2])
+
+# (alice setting, bob setting, sign) terms of S = E00 + E01 + E10 - E11
+CHSH_TERMS = ((0, 1, 1), (0, 2, 1), (1, 1, 1), (1, 2, -1))
+CLASSICAL_BOUND = 2.0
+TSIRELSON_BOUND = 2 * np.sqrt(2)
+
+
+@dataclass
+class PairRounds:
+    protocol: str
+    alice_settings: np.ndarray
+    bob_settings: np.ndarray
+    alice_bits: np.ndarray
+    bob_bits: np.ndarray
+    eve_mask: np.ndarray
+
+    @property
+    def n_pairs(self):
+        return len(self.alice_bits)
+
+    def key_mask(self):
+        # E91 keys on the shared Z setting, BBM92 on any matching basis
+        if self.protocol == "E91":
+            return (self.alice_settings == 0) & (self.bob_settings == 0)
+        return self.alice_settings == self.bob_settings
+
+    def qber(self):
+        mask = self.key_mask()
+        sifted = int(mask.sum())
+        errors = int(((self.alice_bits != self.bob_bits) & mask).sum())
+        return (errors / sifted if sifted else 0.0), sifted
+
+
+def _angles(protocol):
+    if protocol == "E91":
+        return E91_ALICE_ANGLES, E91_BOB_ANGLES
+    if protocol == "BBM92":
+        return BBM92_ANGLES, BBM92_ANGLES
+    raise ValueError(f"Unknown protocol: {protocol}")
+
+
+def _flip(p, rng):
+    return (rng.random(np.shape(p)) < p).astype(np.uint8)
+
+
+def _depolarize(bob_bits, visibility, rng):
+    # white noise: with probability 1 - V Bob's outcome is a fair coin, which
+    # scales every correlation by V
+    if visibility >= 1:
+        return bob_bits
+    noisy = rng.random(len(bob_bits)) >= visibility
+    coin = rng.integers(0, 2, len(bob_bits), dtype=np.uint8)
+    return np.where(noisy, coin, bob_bits).astype(np.uint8)
+
+
+def simulate_pairs(n_pairs, protocol="E91", eve_config=None, visibility=1.0, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    if eve_config is None:
+        eve_config = EveConfig(active=False)
+    alice_angles, bob_angles = _angles(protocol)
+
+    a = rng.integers(0, len(alice_angles), n_pairs, dtype=np.uint8)
+    b = rng.integers(0, len(bob_angles), n_pairs, dtype=np.uint8)
+    theta_a, theta_b = alice_angles[a], bob_angles[b]
+
+    # entangled pairs: Bob agrees with Alice with probability (1 + E) / 2
+    alice_bits = rng.integers(0, 2, n_pairs, dtype=np.uint8)
+    bob_bits = alice_bits ^ _flip((1 - np.cos(theta_a - theta_b)) / 2, rng)
+
+    if eve_config.active:
+        # intercept-resend on Bob's half in Z or X: both sides end up with a
+        # product state aligned to Eve's outcome, E = cos(a - phi) cos(b - phi)
+        eve_mask = rng.random(n_pairs) < eve_config.intercept_rate
+        phi = BBM92_ANGLES[rng.integers(0, 2, n_pairs)]
+        eve_bits = rng.integers(0, 2, n_pairs, dtype=np.uint8)
+        alice_bits = np.where(
+            eve_mask, eve_bits ^ _flip((1 - np.cos(theta_a - phi)) / 2, rng), alice_bits
+        )
+        bob_bits = np.where(
+            eve_mask, eve_bits ^ _flip((1 - np.cos(theta_b - phi)) / 2, rng), bob_bits
+        )
+    else:
+        eve_mask = np.zeros(n_pairs, dtype=bool)
+
+    return PairRounds(
+        protocol,
+        a,
+        b,
+        alice_bits.astype(np.uint8),
+        _depolarize(bob_bits.astype(np.uint8), visibility, rng),
+        eve_mask,
+    )
+
+
+def _pair_circuit(theta_a, theta_b, phi=None):
+    n_clbits = 2 if phi is None else 3
+    qc = QuantumCircuit(2, n_clbits)
+    qc.h(0)
+    qc.cx(0, 1)
+    if phi is not None:
+        # Eve measures Bob's half at phi and resends her outcome
+        qc.ry(-phi, 1)
+        qc.measure(1, 2)
+        qc.ry(phi, 1)
+    qc.ry(-theta_a, 0)
+    qc.ry(-theta_b, 1)
+    qc.measure(0, 0)
+    qc.measure(1, 1)
+    return qc
+
+
+def simulate_pairs_qiskit(
+    n_pairs, protocol="E91", eve_config=None, visibility=1.0, rng=None, simulator=None
+):
+    # one circuit per (setting pair, Eve basis) group, run with as many shots
+    # as rounds fell into the group, so a block costs at most 18 circuits
+    if rng is None:
+        rng = np.random.default_rng()
+    if eve_config is None:
+        eve_config = EveConfig(active=False)
+    if simulator is None:
+        simulator = SIMULATOR
+    alice_angles, bob_angles = _angles(protocol)
+
+    a = rng.integers(0, len(alice_angles), n_pairs, dtype=np.uint8)
+    b = rng.integers(0, len(bob_angles), n_pairs, dtype=np.uint8)
+    if eve_config.active:
+        eve_mask = rng.random(n_pairs) < eve_config.intercept_rate
+    else:
+        eve_mask = np.zeros(n_pairs, dtype=bool)
+    # 0 = no Eve, 1 = Eve in Z, 2 = Eve in X
+    eve_group = np.where(eve_mask, 1 + rng.integers(0, 2, n_pairs), 0)
+
+    group = (a.astype(np.int64) * len(bob_angles) + b) * 3 + eve_group
+    keys, inverse = np.unique(group, return_inverse=True)
+    circuits, shots = [], []
+    for key in keys:
+        ab, e = divmod(int(key), 3)
+        i, j = divmod(ab, len(bob_angles))
+        phi = None if e == 0 else BBM92_ANGLES[e - 1]
+        circuits.append(_pair_circuit(alice_angles[i], bob_angles[j], phi))
+        shots.append(int((group == key).sum()))
+
+    alice_bits = np.empty(n_pairs, dtype=np.uint8)
+    bob_bits = np.empty(n_pairs, dtype=np.uint8)
+    compiled = transpile(circuits, simulator)
+    for k, (qc, n) in enumerate(zip(compiled, shots)):
+        memory = simulator.run(qc, shots=n, memory=True).result().get_memory()
+        # bitstrings are little-endian: clbit 0 is the last character
+        chars = np.frombuffer("".join(memory).encode(), np.uint8).reshape(n, -1)
+        rows = np.flatnonzero(inverse == k)
+        alice_bits[rows] = chars[:, -1] - ord("0")
+        bob_bits[rows] = chars[:, -2] - ord("0")
+
+    return PairRounds(
+        protocol, a, b, alice_bits, _depolarize(bob_bits, visibility, rng), eve_mask
+    )
+
+
+@dataclass
+class CHSHAccumulator:
+    # running sums per CHSH setting pair, so S is updated block by block
+    # without keeping the rounds; accumulators from parallel runs can be added
+    counts: np.ndarray = field(default_factory=lambda: np.zeros(4, dtype=np.int64))
+    products: np.ndarray = field(default_factory=lambda: np.zeros(4, dtype=np.int64))
+    sifted: int = 0
+    errors: int = 0
+
+    def update(self, rounds):
+        mask, errors = rounds.key_mask(), rounds.alice_bits != rounds.bob_bits
+        self.sifted += int(mask.sum())
+        self.errors += int((errors & mask).sum())
+        if rounds.protocol != "E91":
+            return self
+
+        # outcome product is +1 when the bits agree and -1 otherwise
+        sign = 1 - 2 * errors.astype(np.int64)
+        for t, (i, j, _) in enumerate(CHSH_TERMS):
+            sel = (rounds.alice_settings == i) & (rounds.bob_settings == j)
+            self.counts[t] += int(sel.sum())
+            self.products[t] += int(sign[sel].sum())
+        return self
+
+    def __add__(self, other):
+        return CHSHAccumulator(
+            self.counts + other.counts,
+            self.products + other.products,
+            self.sifted + other.sifted,
+            self.errors + other.errors,
+        )
+
+    def correlations(self):
+        return np.divide(
+            self.products,
+            self.counts,
+            out=np.zeros(4),
+            where=self.counts > 0,
+        )
+
+    def s_value(self):
+        signs = np.array([s for _, _, s in CHSH_TERMS])
+        return float(signs @ self.correlations())
+
+    def std_error(self):
+        # each E is a mean of +-1 outcomes with variance 1 - E^2
+        if (self.counts == 0).any():
+            return float("inf")
+        return float(np.sqrt(((1 - self.correlations() ** 2) / self.counts).sum()))
+
+    def confidence_interval(self, level=0.95):
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        s, se = self.s_value(), self.std_error()
+        return s - z * se, s + z * se
+
+    def qber(self):
+        return self.errors / self.sifted if self.sifted else 0.0
+
+    def violates_bell(self, level=0.95):
+        # Eve is ruled out only while S stays significantly above 2
+        return self.confidence_interval(level)[0] > CLASSICAL_BOUND
+
+
+def monitor(
+    n_pairs,
+    block_size=100_000,
+    eve_config=None,
+    visibility=1.0,
+    engine="vectorized",
+    rng=None,
+):
+    # yields (pairs so far, accumulator) after every block of E91 pairs
+    simulate = {"vectorized": simulate_pairs, "qiskit": simulate_pairs_qiskit}
+    if engine not in simulate:
+        raise ValueError(f"Unknown engine: {engine}")
+    if rng is None:
+        rng = np.random.default_rng()
+
+    acc = CHSHAccumulator()
+    for start in range(0, n_pairs, block_size):
+        n = min(block_size, n_pairs - start)
+        acc.update(simulate[engine](n, "E91", eve_config, visibility, rng))
+        yield start + n, acc
+
+
+# %%
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for label, eve, engine, n_pairs in [
+        ("no Eve", EveConfig(), "vectorized", 1_000_000),
+        (
+            "Eve 100%",
+            EveConfig(active=True, intercept_rate=1.0),
+            "vectorized",
+            1_000_000,
+        ),
+        ("Eve 30%", EveConfig(active=True, intercept_rate=0.3), "qiskit", 100_000),
+    ]:
+        for n, acc in monitor(n_pairs, n_pairs // 4, eve, 0.98, engine, rng):
+            lo, hi = acc.confidence_interval()
+            print(
+                f"{label:9s} {engine:10s} {n:>9d} pairs  S={acc.s_value():.3f} "
+                f"[{lo:.3f}, {hi:.3f}]  QBER={acc.qber():.3f}  "
+                f"violation={acc.violates_bell()}"
+            )
@@ -0,0 +1,175 @@
+# %%
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+from protocols import get_protocol
+
+DEFAULT_FRACTIONS = tuple(np.round(np.linspace(0.01, 0.5, 50), 4))
+DEFAULT_THRESHOLDS = tuple(np.round(np.linspace(0.0, 0.2, 81), 4))
+
+
+def channel_qber(protocol, noise_prob, intercept_rate):
+    # intercept-resend on a fraction of the qubits, then independent bit flips
+    q = intercept_rate * protocol.intercept_qber
+    return q + noise_prob * (1 - 2 * q)
+
+
+@dataclass(frozen=True)
+class EstimationPlan:
+    sample_fraction: float
+    threshold: float
+    sample_size: int
+    expected_secret_bits: float
+    accept_probability: float
+    false_accept_probability: float
+    qber: float
+
+
+def _evaluate(
+    n_qubits, noise_prob, intercept_rate, protocol, false_accept, fractions, thresholds
+):
+    # For every sample fraction f Alice discloses k = f * n sifted bits; the
+    # errors found are X ~ Binomial(k, Q). The session continues when X / k is
+    # within the threshold and keeps n - k bits at the finite-size rate
+    # 1 - 2h(X / k + mu), mu = sqrt(ln(1 / eps) / 2k) from Hoeffding. Expected
+    # key over X is a cumulative sum, so all thresholds of one fraction come
+    # from a single pass. A plan is admissible only if a fully intercepted
+    # channel would pass the test with probability at most false_accept.
+    protocol = get_protocol(protocol)
+    n_sifted = int(round(n_qubits * protocol.sift_probability))
+    qber = channel_qber(protocol, noise_prob, intercept_rate)
+    attack_qber = channel_qber(protocol, noise_prob, 1.0)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    rows = []
+    for fraction in fractions:
+        k = int(round(fraction * n_sifted))
+        if k == 0:
+            continue
+        # largest error count each threshold still accepts; counts above the
+        # highest cut never contribute
+        cut = np.floor(thresholds * k + 1e-9).astype(int)
+        x = np.arange(cut.max() + 1)
+        mu = np.sqrt(np.log(1 / false_accept) / (2 * k))
+        key = (n_sifted - k) * protocol.secret_fraction(np.minimum(x / k + mu, 0.5))
+
+        pmf = binom.pmf(x, k, qber)
+        expected = np.cumsum(pmf * key)[cut]
+        accept = binom.cdf(cut, k, qber)
+        false_accepts = binom.cdf(cut, k, attack_qber)
+        rows.append(
+            pd.DataFrame(
+                {
+                    "Sample Fraction": fraction,
+                    "Threshold": thresholds,
+                    "Sample Size": k,
+                    "Expected Secret Bits": expected,
+                    "Accept Probability": accept,
+                    "False Accept Probability": false_accepts,
+                }
+            )
+        )
+
+    df = pd.concat(rows, ignore_index=True)
+    df["Admissible"] = df["False Accept Probability"] <= false_accept
+    df.attrs["qber"] = qber
+    return df
+
+
+def estimation_grid(
+    n_qubits,
+    noise_prob=0.0,
+    intercept_rate=0.0,
+    protocol="BB84",
+    false_accept=1e-3,
+    fractions=DEFAULT_FRACTIONS,
+    thresholds=DEFAULT_THRESHOLDS,
+):
+    return _evaluate(
+        n_qubits,
+        noise_prob,
+        intercept_rate,
+        protocol,
+        false_accept,
+        fractions,
+        thresholds,
+    )
+
+
+@lru_cache(maxsize=1024)
+def optimize_estimation(
+    n_qubits,
+    noise_prob=0.0,
+    intercept_rate=0.0,
+    protocol="BB84",
+    false_accept=1e-3,
+    fractions=DEFAULT_FRACTIONS,
+    thresholds=DEFAULT_THRESHOLDS,
+):
+    # sample fraction and abort threshold with the most expected secret key
+    # per session; cached per (n_qubits, channel) so repeated queries are free.
+    # Grids must be tuples to be hashable.
+    if not 0 < false_accept < 1:
+        raise ValueError("false_accept must be in (0, 1)")
+    df = _evaluate(
+        n_qubits,
+        noise_prob,
+        intercept_rate,
+        protocol,
+        false_accept,
+        fractions,
+        thresholds,
+    )
+    admissible = df[df["Admissible"]]
+    if admissible.empty:
+        raise ValueError(
+            f"No sample fraction keeps false accepts below {false_accept} "
+            f"with {n_qubits} qubits"
+        )
+    best = admissible.loc[admissible["Expected Secret Bits"].idxmax()]
+    return EstimationPlan(
+        sample_fraction=float(best["Sample Fraction"]),
+        threshold=float(best["Threshold"]),
+        sample_size=int(best["Sample Size"]),
+        expected_secret_bits=float(best["Expected Secret Bits"]),
+        accept_probability=float(best["Accept Probability"]),
+        false_accept_probability=float(best["False Accept Probability"]),
+        qber=float(df.attrs["qber"]),
+    )
+
+
+# %%
+if __name__ == "__main__":
+    import time
+
+    for n_qubits in (1_000, 10_000, 100_000, 1_000_000):
+        start = time.perf_counter()
+        plan = optimize_estimation(n_qubits, noise_prob=0.02)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        optimize_estimation(n_qubits, noise_prob=0.02)
+        cached = time.perf_counter() - start
+        print(
+            f"{n_qubits:>9d} qubits: sample {plan.sample_fraction:.2f} "
+            f"({plan.sample_size} bits), threshold {plan.threshold:.3f}, "
+            f"{plan.expected_secret_bits:.0f} expected secret bits, "
+            f"accept {plan.accept_probability:.3f}, "
+            f"false accept {plan.false_accept_probability:.1e} "
+            f"[{first * 1e3:.0f} ms, cached {cached * 1e6:.0f} us]"
+        )
+
+    # the fixed defaults (10% sample, 0.11 threshold) against the plan
+    grid = estimation_grid(100_000, noise_prob=0.02)
+    defaults = grid[
+        np.isclose(grid["Sample Fraction"], 0.1) & np.isclose(grid["Threshold"], 0.11)
+    ].iloc[0]
+    plan = optimize_estimation(100_000, noise_prob=0.02)
+    print(
+        f"defaults: {defaults['Expected Secret Bits']:.0f} expected secret bits, "
+        f"false accept {defaults['False Accept Probability']:.1e}; "
+        f"optimized: {plan.expected_secret_bits:.0f}"
+    )
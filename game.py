@@ -1,6 +1,39 @@
 # %%
+import numpy as np
+import pandas as pd
+
 from bb84_protocol import BB84Protocol
 
+# QBER thresholds of the difficulty levels offered by the app
+DIFFICULTY_THRESHOLDS = {"Easy": 0.15, "Medium": 0.12, "Hard": 0.10}
+
+# status/result are stored as small codes and only expanded to labels on read
+STATUS_LABELS = np.array(
+    [
+        "LET PASS",
+        "INTERCEPTED (Eve: Z basis)",
+        "INTERCEPTED (Eve: X basis)",
+    ]
+)
+RESULT_LABELS = np.array(
+    [
+        "Match - Kept",
+        "ERROR - Kept but wrong",
+        "Different bases - Discarded",
+    ]
+)
+HISTORY_DTYPE = np.dtype(
+    [
+        ("round", "u4"),
+        ("alice_basis", "U1"),
+        ("alice_bit", "u1"),
+        ("bob_basis", "U1"),
+        ("bob_bit", "u1"),
+        ("status", "u1"),
+        ("result", "u1"),
+    ]
+)
+
 
 class BB84Game:
 
@@ -12,6 +45,9 @@ class BB84Game:
         self.current_round = 0
         self.qber_history = []
         self.key_len_history = []
+        self.history = np.zeros(n_qubits, dtype=HISTORY_DTYPE)
+        self.sifted_count = 0
+        self.error_count = 0
 
     def reset(self):
         self.bb84.reset()
@@ -19,43 +55,77 @@ class BB84Game:
         self.current_round = 0
         self.qber_history = []
         self.key_len_history = []
+        self.history = np.zeros(self.n_qubits, dtype=HISTORY_DTYPE)
+        self.sifted_count = 0
+        self.error_count = 0
 
     def intercept_qubit(self, basis):
         alice_bit, alice_basis, bob_bit, bob_basis = self.bb84.send_qubit(
             eve_intercepts=True, eve_basis=basis
         )
         self.score["intercepted"] += 1
-        self._update_stats()
-        self.current_round += 1
-
-        return {
+        result = {
             "alice_bit": alice_bit,
             "alice_basis": alice_basis,
             "bob_bit": bob_bit,
             "bob_basis": bob_basis,
             "eve_basis": basis,
         }
+        self._record(result)
+        self._update_stats()
+        self.current_round += 1
+
+        return result
 
     def let_pass_qubit(self):
         alice_bit, alice_basis, bob_bit, bob_basis = self.bb84.send_qubit(
             eve_intercepts=False
         )
-        self._update_stats()
-        self.current_round += 1
-
-        return {
+        result = {
             "alice_bit": alice_bit,
             "alice_basis": alice_basis,
             "bob_bit": bob_bit,
             "bob_basis": bob_basis,
             "eve_basis": None,
         }
+        self._record(result)
+        self._update_stats()
+        self.current_round += 1
+
+        return result
+
+    def _record(self, result):
+        # append-only log, one row per played round
+        basis_match = result["alice_basis"] == result["bob_basis"]
+        bit_match = result["alice_bit"] == result["bob_bit"]
+
+        if result["eve_basis"] is None:
+            status = 0
+        else:
+            status = 1 if result["eve_basis"] == "Z" else 2
+
+        if basis_match:
+            result_code = 0 if bit_match else 1
+            self.sifted_count += 1
+            self.error_count += not bit_match
+        else:
+            result_code = 2
+
+        self.history[self.current_round] = (
+            self.current_round + 1,
+            result["alice_basis"],
+            result["alice_bit"],
+            result["bob_basis"],
+            result["bob_bit"],
+            status,
+            result_code,
+        )
 
     def _update_stats(self):
-        qber, key_len = self.bb84.calculate_qber(self.current_round + 1)
-        if key_len > 0:
-            self.qber_history.append(qber)
-            self.key_len_history.append(key_len)
+        # running counts give the same values as calculate_qber(round + 1)
+        if self.sifted_count > 0:
+            self.qber_history.append(self.error_count / self.sifted_count)
+            self.key_len_history.append(self.sifted_count)
 
     def is_game_over(self):
         return self.current_round >= self.n_qubits
@@ -87,8 +157,8 @@ class BB84Game:
         }
 
     def get_current_stats(self):
-        if self.current_round > 0:
-            qber, key_len = self.bb84.calculate_qber(self.current_round)
+        if self.sifted_count > 0:
+            qber, key_len = self.error_count / self.sifted_count, self.sifted_count
         else:
             qber, key_len = 0.0, 0
 
@@ -100,70 +170,70 @@ class BB84Game:
             "progress": self.current_round / self.n_qubits,
         }
 
-    def get_transmission_history(self):
-        history = []
-
-        for i in range(self.current_round):
-            alice_bit = self.bb84.alice_bits[i]
-            alice_basis = self.bb84.alice_bases[i]
-            bob_bit = self.bb84.bob_bits[i]
-            bob_basis = self.bb84.bob_bases[i]
-            eve_interception = self.bb84.eve_interceptions[i]
-
-            basis_match = alice_basis == bob_basis
-            bit_match = alice_bit == bob_bit
-
-            if eve_interception:
-                status = f"INTERCEPTED (Eve: {eve_interception['eve_basis']} basis)"
-            else:
-                status = "LET PASS"
-
-            if basis_match:
-                if bit_match:
-                    result = "Match - Kept"
-                else:
-                    result = "ERROR - Kept but wrong"
-            else:
-                result = "Different bases - Discarded"
-
-            history.append(
-                {
-                    "round": i + 1,
-                    "alice_basis": alice_basis,
-                    "alice_bit": alice_bit,
-                    "bob_basis": bob_basis,
-                    "bob_bit": bob_bit,
-                    "status": status,
-                    "result": result,
-                }
-            )
-
-        return history
-
-
-# %%
-import numpy as np
+    def get_transmission_history(self, start=0, stop=None):
+        rows = self.history_window(start, stop)
+
+        return [
+            {
+                "round": int(row["round"]),
+                "alice_basis": str(row["alice_basis"]),
+                "alice_bit": int(row["alice_bit"]),
+                "bob_basis": str(row["bob_basis"]),
+                "bob_bit": int(row["bob_bit"]),
+                "status": str(STATUS_LABELS[row["status"]]),
+                "result": str(RESULT_LABELS[row["result"]]),
+            }
+            for row in rows
+        ]
+
+    def history_window(self, start=0, stop=None):
+        # zero-copy view of played rounds [start, stop)
+        stop = self.current_round if stop is None else min(stop, self.current_round)
+        return self.history[max(start, 0) : max(stop, 0)]
+
+    def history_pages(self, page_size=20):
+        return max(1, -(-self.current_round // page_size))
+
+    def history_page(self, page, page_size=20):
+        start = page * page_size
+        return self.history_frame(start, start + page_size)
+
+    def history_frame(self, start=0, stop=None):
+        rows = self.history_window(start, stop)
+
+        return pd.DataFrame(
+            {
+                "Round": rows["round"],
+                "Alice Basis": rows["alice_basis"],
+                "Alice Bit": rows["alice_bit"],
+                "Bob Basis": rows["bob_basis"],
+                "Bob Bit": rows["bob_bit"],
+                "Status": pd.Categorical.from_codes(rows["status"], STATUS_LABELS),
+                "Result": pd.Categorical.from_codes(rows["result"], RESULT_LABELS),
+            }
+        )
 
-np.random.seed(42)
-game = BB84Game(n_qubits=20, threshold=0.11)
-
-# Test no interception
-game.reset()
-while not game.is_game_over():
-    game.let_pass_qubit()
-results = game.get_final_results()
-assert (
-    abs(results["final_qber"]) < 1e-6
-), f"expected qber 0, got {results['final_qber']}"
-assert not results["detected"], "should not be detected"
-print("Test 1 passed, no iterception, qber0")
-
-# Test with interception
-game.reset()
-while not game.is_game_over():
-    game.intercept_qubit(basis="X")
-results = game.get_final_results()
-assert results["detected"], f"expected detection, qber={results['final_qber']}"
-print("Test 2 passed")
 
 # %%
+if __name__ == "__main__":
+    np.random.seed(42)
+    game = BB84Game(n_qubits=20, threshold=0.11)
+
+    # Test no interception
+    game.reset()
+    while not game.is_game_over():
+        game.let_pass_qubit()
+    results = game.get_final_results()
+    assert (
+        abs(results["final_qber"]) < 1e-6
+    ), f"expected qber 0, got {results['final_qber']}"
+    assert not results["detected"], "should not be detected"
+    print("Test 1 passed, no iterception, qber0")
+
+    # Test with interception
+    game.reset()
+    while not game.is_game_over():
+        game.intercept_qubit(basis="X")
+    results = game.get_final_results()
+    assert results["detected"], f"expected detection, qber={results['final_qber']}"
+    print("Test 2 passed")
@@ -0,0 +1,235 @@
+# %%
+import inspect
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from multiprocessing import Manager, get_context
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = (
+    "pending",
+    "running",
+    "done",
+    "failed",
+    "cancelled",
+)
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class ProgressReporter:
+    # passed to the job as its `progress` callback; raising from inside the
+    # callback is how a running job notices that it was cancelled
+
+    def __init__(self, job_id, state, cancel_event):
+        self.job_id = job_id
+        self.state = state
+        self.cancel_event = cancel_event
+
+    def __call__(self, fraction, message=None):
+        self.state[self.job_id] = (float(fraction), message)
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.job_id)
+
+
+def _run_job(fn, args, kwargs, reporter):
+    if reporter.cancel_event.is_set():
+        raise JobCancelled(reporter.job_id)
+    if "progress" in inspect.signature(fn).parameters:
+        kwargs = {**kwargs, "progress": reporter}
+    return fn(*args, **kwargs)
+
+
+@dataclass
+class Job:
+    id: str
+    name: str
+    owner: str = None
+    status: str = PENDING
+    progress: float = 0.0
+    message: str = None
+    result: object = None
+    error: str = None
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobManager:
+    # background executor for long analyses; finished jobs are kept for `ttl`
+    # seconds, and at most `max_finished` of them, oldest evicted first
+
+    def __init__(self, max_workers=2, kind="thread", max_finished=64, ttl=3600):
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="job")
+            self._manager = None
+            self._state = {}
+            self._new_event = threading.Event
+        elif kind == "process":
+            # spawn, as in cli.run_scenarios: a forked child would inherit the
+            # parent's AerSimulator threads in an undefined state
+            self.executor = ProcessPoolExecutor(
+                max_workers, mp_context=get_context("spawn")
+            )
+            self._manager = Manager()
+            self._state = self._manager.dict()
+            self._new_event = self._manager.Event
+        else:
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.kind = kind
+        self.max_finished = max_finished
+        self.ttl = ttl
+        self.jobs = {}
+        self._futures = {}
+        self._cancel = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, name=None, owner=None, **kwargs):
+        job = Job(uuid.uuid4().hex[:12], name or fn.__name__, owner)
+        cancel_event = self._new_event()
+        reporter = ProgressReporter(job.id, self._state, cancel_event)
+
+        with self._lock:
+            self._evict()
+            self.jobs[job.id] = job
+            self._cancel[job.id] = cancel_event
+            self._state[job.id] = (0.0, None)
+            future = self.executor.submit(_run_job, fn, args, kwargs, reporter)
+            self._futures[job.id] = future
+
+        future.add_done_callback(lambda f, job_id=job.id: self._finish(job_id, f))
+        return job.id
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.finished = time.time()
+            job.started = job.started or job.finished
+            if future.cancelled():
+                job.status = CANCELLED
+            elif isinstance(future.exception(), JobCancelled):
+                job.status = CANCELLED
+            elif future.exception() is not None:
+                job.status = FAILED
+                job.error = repr(future.exception())
+            else:
+                job.status = DONE
+                job.result = future.result()
+                job.progress = 1.0
+            self._futures.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self._sync(job)
+            return job
+
+    def _sync(self, job):
+        if job.done:
+            return
+        future = self._futures.get(job.id)
+        if future is not None and future.running() and job.status == PENDING:
+            job.status = RUNNING
+            job.started = time.time()
+        job.progress, job.message = self._state.get(job.id, (job.progress, None))
+
+    def list(self, owner=None):
+        with self._lock:
+            jobs = [j for j in self.jobs.values() if owner is None or j.owner == owner]
+            for job in jobs:
+                self._sync(job)
+            return sorted(jobs, key=lambda j: j.submitted)
+
+    def result(self, job_id, timeout=None):
+        future = self._futures.get(job_id)
+        if future is not None:
+            wait([future], timeout)
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.status == FAILED:
+            raise RuntimeError(f"Job {job_id} failed: {job.error}")
+        if job.status == CANCELLED:
+            raise JobCancelled(job_id)
+        return job.result
+
+    def cancel(self, job_id):
+        # pending jobs never start; running ones stop at their next progress call
+        with self._lock:
+            if job_id not in self.jobs or self.jobs[job_id].done:
+                return False
+            self._cancel[job_id].set()
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+        return True
+
+    def forget(self, job_id):
+        with self._lock:
+            self._drop(job_id)
+
+    def _drop(self, job_id):
+        self.jobs.pop(job_id, None)
+        self._cancel.pop(job_id, None)
+        self._state.pop(job_id, None)
+
+    def _evict(self):
+        now = time.time()
+        finished = sorted(
+            (j for j in self.jobs.values() if j.done), key=lambda j: j.finished
+        )
+        expired = [j for j in finished if now - j.finished > self.ttl]
+        overflow = finished[: max(0, len(finished) - self.max_finished)]
+        for job in {j.id: j for j in expired + overflow}.values():
+            self._drop(job.id)
+
+    def shutdown(self, wait=True, cancel_pending=True):
+        for job_id in list(self.jobs):
+            if cancel_pending:
+                self.cancel(job_id)
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+
+# %%
+if __name__ == "__main__":
+    from analyzer import BB84Analyzer
+
+    manager = JobManager(max_workers=2)
+    slow = manager.submit(
+        BB84Analyzer.generate_dataset, 40, 20, 0.02, 0.5, name="dataset"
+    )
+    doomed = manager.submit(
+        BB84Analyzer.generate_dataset, 400, 20, 0.02, 0.5, name="cancelled"
+    )
+
+    while not manager.get(slow).done:
+        for job in manager.list():
+            print(f"{job.name:10s} {job.status:9s} {job.progress:6.1%}")
+        if manager.get(doomed).progress > 0.05:
+            manager.cancel(doomed)
+        time.sleep(1.0)
+
+    print(manager.result(slow).groupby("Eve Present").size())
+    print(f"cancelled job status: {manager.get(doomed).status}")
+    manager.shutdown()
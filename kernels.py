@@ -0,0 +1,249 @@
+# %%
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# basis policy codes
+RANDOM_BASIS, Z_BASIS, X_BASIS = 0, 1, 2
+BACKENDS = ("numba", "numpy", "python")
+
+
+@dataclass
+class RoundDraws:
+    # all randomness of n_games independent games, shape (n_rounds, n_games);
+    # every backend consumes the same draws, so results match exactly
+    alice_bit: np.ndarray
+    alice_basis: np.ndarray
+    bob_basis: np.ndarray
+    u: np.ndarray
+    eve_coin: np.ndarray
+    eve_flip: np.ndarray
+    bob_flip: np.ndarray
+    noise_u: np.ndarray
+
+    @property
+    def n_rounds(self):
+        return self.alice_bit.shape[0]
+
+    @classmethod
+    def draw(cls, n_rounds, n_games, rng, noise=False):
+        # per round, in the order strategy's loop has always drawn them
+        draws = {name: [] for name in cls.__dataclass_fields__}
+        for _ in range(n_rounds):
+            draws["alice_bit"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            draws["alice_basis"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            draws["bob_basis"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            draws["u"].append(rng.random(n_games))
+            draws["eve_coin"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            draws["eve_flip"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            draws["bob_flip"].append(rng.integers(0, 2, n_games, dtype=np.int8))
+            if noise:
+                draws["noise_u"].append(rng.random(n_games))
+        if not noise:
+            draws["noise_u"] = [np.ones(n_games)] * n_rounds
+        return cls(**{name: np.stack(values) for name, values in draws.items()})
+
+
+def _rounds_loop(
+    alice_bit,
+    alice_basis,
+    bob_basis,
+    u,
+    eve_coin,
+    eve_flip,
+    bob_flip,
+    noise_u,
+    rate,
+    cap,
+    basis,
+    noise_prob,
+    sifted,
+    errors,
+    intercepted,
+):
+    # scalar reference of one BB84Game per (policy, game): Eve intercepts with
+    # probability rate while the QBER she has observed stays within cap
+    n_rounds, n_games = alice_bit.shape
+    for p in range(len(rate)):
+        for g in range(n_games):
+            s = 0
+            e = 0
+            k = 0
+            for r in range(n_rounds):
+                observed = e / s if s > 0 else 0.0
+                a_bit = alice_bit[r, g]
+                a_basis = alice_basis[r, g]
+                b_basis = bob_basis[r, g]
+
+                state_basis = a_basis
+                state_bit = a_bit
+                if u[r, g] < rate[p] and observed <= cap[p]:
+                    k += 1
+                    eve_basis = eve_coin[r, g] if basis[p] == 0 else basis[p] - 1
+                    state_basis = eve_basis
+                    if eve_basis != a_basis:
+                        state_bit = eve_flip[r, g]
+
+                bob_bit = state_bit if state_basis == b_basis else bob_flip[r, g]
+                if noise_u[r, g] < noise_prob:
+                    bob_bit = 1 - bob_bit
+                if a_basis == b_basis:
+                    s += 1
+                    if bob_bit != a_bit:
+                        e += 1
+            sifted[p, g] = s
+            errors[p, g] = e
+            intercepted[p, g] = k
+
+
+def _rounds_numpy(
+    alice_bit,
+    alice_basis,
+    bob_basis,
+    u,
+    eve_coin,
+    eve_flip,
+    bob_flip,
+    noise_u,
+    rate,
+    cap,
+    basis,
+    noise_prob,
+    sifted,
+    errors,
+    intercepted,
+):
+    # vectorized over policies and games; the loop runs over rounds because
+    # the adaptive rule reads the QBER accumulated so far
+    rate = rate[:, None]
+    cap = cap[:, None]
+    basis = basis[:, None]
+    shape = sifted.shape
+
+    for r in range(alice_bit.shape[0]):
+        observed = np.divide(errors, sifted, out=np.zeros(shape), where=sifted > 0)
+        intercept = (u[r] < rate) & (observed <= cap)
+        eve_basis = np.where(basis == RANDOM_BASIS, eve_coin[r], basis - 1)
+
+        # a wrong-basis measurement randomizes the bit, then Bob's measurement
+        # of Eve's state is random again unless he shares her basis
+        eve_bit = np.where(eve_basis == alice_basis[r], alice_bit[r], eve_flip[r])
+        state_basis = np.where(intercept, eve_basis, alice_basis[r])
+        state_bit = np.where(intercept, eve_bit, alice_bit[r])
+        bob_bit = np.where(state_basis == bob_basis[r], state_bit, bob_flip[r])
+        bob_bit = bob_bit ^ (noise_u[r] < noise_prob)
+
+        match = alice_basis[r] == bob_basis[r]
+        sifted += match
+        errors += match & (bob_bit != alice_bit[r])
+        intercepted += intercept
+
+
+_KERNELS = {"numpy": _rounds_numpy, "python": _rounds_loop}
+if njit is not None:
+    _KERNELS["numba"] = njit(cache=True, nogil=True)(_rounds_loop)
+
+
+def available_backends():
+    return [name for name in BACKENDS if name in _KERNELS]
+
+
+def play_rounds(draws, rate, cap, basis, noise_prob=0.0, backend=None):
+    # (sifted, errors, intercepted) per (policy, game); backend defaults to
+    # numba when it is installed and numpy otherwise
+    if backend is None:
+        backend = available_backends()[0]
+    if backend not in _KERNELS:
+        raise ValueError(
+            f"Unknown or unavailable backend: {backend}. "
+            f"Choose from {available_backends()}"
+        )
+
+    rate = np.asarray(rate, dtype=float)
+    cap = np.asarray(cap, dtype=float)
+    basis = np.asarray(basis, dtype=np.int8)
+    shape = (len(rate), draws.alice_bit.shape[1])
+    sifted = np.zeros(shape, dtype=np.int32)
+    errors = np.zeros(shape, dtype=np.int32)
+    intercepted = np.zeros(shape, dtype=np.int32)
+
+    _KERNELS[backend](
+        draws.alice_bit,
+        draws.alice_basis,
+        draws.bob_basis,
+        draws.u,
+        draws.eve_coin,
+        draws.eve_flip,
+        draws.bob_flip,
+        draws.noise_u,
+        rate,
+        cap,
+        basis,
+        float(noise_prob),
+        sifted,
+        errors,
+        intercepted,
+    )
+    return sifted, errors, intercepted
+
+
+def benchmark_kernels(
+    n_rounds=20, n_games=2000, n_policies=64, noise_prob=0.01, seed=0, repeats=3
+):
+    # nanoseconds per simulated round (one policy, one game, one qubit)
+    rng = np.random.default_rng(seed)
+    draws = RoundDraws.draw(n_rounds, n_games, rng, noise=True)
+    rate = rng.random(n_policies)
+    cap = np.where(rng.random(n_policies) < 0.5, np.inf, 0.1)
+    basis = rng.integers(0, 3, n_policies, dtype=np.int8)
+
+    expected = play_rounds(draws, rate, cap, basis, noise_prob, "numpy")
+    rows = []
+    for backend in available_backends():
+        # the scalar loop is only timed on a slice of the games
+        games = slice(None) if backend != "python" else slice(0, 50)
+        sub = RoundDraws(
+            **{k: getattr(draws, k)[:, games] for k in draws.__dataclass_fields__}
+        )
+        play_rounds(sub, rate, cap, basis, noise_prob, backend)  # compile, warm up
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = play_rounds(sub, rate, cap, basis, noise_prob, backend)
+            best = min(best, time.perf_counter() - start)
+        n = sub.alice_bit.size * n_policies
+        rows.append(
+            {
+                "Backend": backend,
+                "Rounds": n,
+                "ns/round": best / n * 1e9,
+                "Matches NumPy": all(
+                    np.array_equal(a, b[:, games]) for a, b in zip(result, expected)
+                ),
+            }
+        )
+    return rows
+
+
+# %%
+if __name__ == "__main__":
+    for row in benchmark_kernels():
+        print(
+            f"{row['Backend']:>6s}: {row['ns/round']:10.1f} ns/round over "
+            f"{row['Rounds']:,} rounds, matches numpy: {row['Matches NumPy']}"
+        )
+
+    # the circuit path runs one simulator call per qubit
+    from bb84_protocol import BB84Protocol, EveConfig
+
+    protocol = BB84Protocol(n_qubits=50)
+    start = time.perf_counter()
+    protocol.run_session(EveConfig(active=True, intercept_rate=0.5), 0.01)
+    elapsed = time.perf_counter() - start
+    print(f"qiskit: {elapsed / 50 * 1e9:10.1f} ns/round")
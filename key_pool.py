@@ -0,0 +1,418 @@
+# %%
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from bb84_protocol import simulate_session
+from protocols import BB84
+
+HEADER_BYTES = 64
+
+
+class MmapKeyStore:
+    # ring buffer of key bytes in a memory-mapped file; the first header words
+    # hold (start, level) so the store survives a restart
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        mode = "r+" if os.path.exists(path) else "w+"
+        self.mm = np.memmap(
+            path, dtype=np.uint8, mode=mode, shape=HEADER_BYTES + capacity
+        )
+        self.header = self.mm[:16].view(np.uint64)
+        self.data = self.mm[HEADER_BYTES:]
+        self.lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0
+
+    @property
+    def level(self):
+        return int(self.header[1])
+
+    def put(self, key_bytes):
+        with self.lock:
+            start, level = int(self.header[0]), int(self.header[1])
+            n = min(len(key_bytes), self.capacity - level)
+            self.dropped += len(key_bytes) - n
+            if n == 0:
+                return 0
+
+            end = (start + level) % self.capacity
+            first = min(n, self.capacity - end)
+            self.data[end : end + first] = key_bytes[:first]
+            self.data[: n - first] = key_bytes[first:n]
+            self.header[1] = level + n
+            self.bytes_in += n
+            return n
+
+    def get(self, n):
+        with self.lock:
+            start, level = int(self.header[0]), int(self.header[1])
+            if n > level:
+                return None
+
+            first = min(n, self.capacity - start)
+            key = np.concatenate(
+                [self.data[start : start + first], self.data[: n - first]]
+            )
+            self.header[0] = (start + n) % self.capacity
+            self.header[1] = level - n
+            self.bytes_out += n
+            return key.tobytes()
+
+    def flush(self):
+        self.mm.flush()
+
+
+class KeyPool:
+
+    def __init__(
+        self,
+        links,
+        directory,
+        capacity=1 << 20,
+        n_qubits=1 << 14,
+        workers=4,
+        seed=None,
+        sample_fraction=0.1,
+    ):
+        # links: {slave SAE id: LinkConfig}
+        os.makedirs(directory, exist_ok=True)
+        self.links = dict(links)
+        self.n_qubits = n_qubits
+        self.sample_fraction = sample_fraction
+        self.workers = workers
+        self.stores = {
+            sae_id: MmapKeyStore(os.path.join(directory, f"{sae_id}.keys"), capacity)
+            for sae_id in self.links
+        }
+        # each link id sits in the work queue once, so its generator is never
+        # used by two workers at the same time
+        self.rngs = {
+            sae_id: np.random.default_rng(s)
+            for sae_id, s in zip(
+                self.links, np.random.SeedSequence(seed).spawn(len(self.links))
+            )
+        }
+        self.sessions = 0
+        self.aborted = 0
+        self.pending = queue.Queue()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.started_at = None
+        self.stats_lock = threading.Lock()
+
+    def run_session(self, sae_id):
+        cfg = self.links[sae_id]
+        rng = self.rngs[sae_id]
+        rounds = simulate_session(self.n_qubits, cfg.eve_config, cfg.noise_prob, rng)
+
+        # the QBER is estimated on a disclosed random sample of the sifted
+        # bits, and the sample never becomes key
+        mask = rounds.sift_mask()
+        alice_key, bob_key = rounds.alice_bits[mask], rounds.bob_bits[mask]
+        sample = rng.random(len(alice_key)) < self.sample_fraction
+        n_sample = int(sample.sum())
+        errors = int((alice_key[sample] != bob_key[sample]).sum())
+        qber = errors / n_sample if n_sample else 0.0
+
+        with self.stats_lock:
+            self.sessions += 1
+            if n_sample == 0 or qber > cfg.threshold:
+                self.aborted += 1
+                return 0
+
+        # error correction (not simulated) leaves Bob with Alice's bits; the
+        # truncation to the secret fraction stands in for privacy amplification
+        remaining = alice_key[~sample]
+        key = remaining[: int(BB84.secret_fraction(qber) * len(remaining))]
+        # whole bytes only, the partial tail is discarded
+        key_bytes = np.packbits(key[: len(key) // 8 * 8])
+        return self.stores[sae_id].put(key_bytes)
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                sae_id = self.pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            store = self.stores[sae_id]
+            if store.level < store.capacity:
+                self.run_session(sae_id)
+            else:
+                # full, back off instead of spinning on this link
+                time.sleep(0.01)
+            self.pending.put(sae_id)
+
+    def start(self):
+        if self.threads:
+            return
+        self.stop_event.clear()
+        self.started_at = time.perf_counter()
+        for sae_id in self.links:
+            self.pending.put(sae_id)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for store in self.stores.values():
+            store.flush()
+
+    def fetch(self, sae_id, n_bytes):
+        if sae_id not in self.stores:
+            raise KeyError(sae_id)
+        return self.stores[sae_id].get(n_bytes)
+
+    def refill_throughput(self):
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.started_at
+        total = sum(store.bytes_in for store in self.stores.values())
+        return total / elapsed if elapsed > 0 else 0.0
+
+
+class KeyServer:
+    # minimal ETSI GS QKD 014 style REST stand-in, for localhost use only
+
+    MAX_KEYS_PER_REQUEST = 128
+    MIN_KEY_SIZE = 64
+    MAX_KEY_SIZE = 8192
+    DEFAULT_KEY_SIZE = 256
+
+    def __init__(
+        self, pool, host="127.0.0.1", port=0, kme_id="KME-local", issued_cache=100_000
+    ):
+        self.pool = pool
+        self.kme_id = kme_id
+        self.issued = OrderedDict()
+        self.issued_cache = issued_cache
+        self.issued_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def status(self, sae_id):
+        store = self.pool.stores[sae_id]
+        return {
+            "source_KME_ID": self.kme_id,
+            "target_KME_ID": self.kme_id,
+            "master_SAE_ID": "master",
+            "slave_SAE_ID": sae_id,
+            "key_size": self.DEFAULT_KEY_SIZE,
+            "stored_key_count": store.level * 8 // self.DEFAULT_KEY_SIZE,
+            "max_key_count": store.capacity * 8 // self.DEFAULT_KEY_SIZE,
+            "max_key_per_request": self.MAX_KEYS_PER_REQUEST,
+            "max_key_size": self.MAX_KEY_SIZE,
+            "min_key_size": self.MIN_KEY_SIZE,
+            "max_SAE_ID_count": 0,
+        }
+
+    def enc_keys(self, sae_id, number, size):
+        if not 1 <= number <= self.MAX_KEYS_PER_REQUEST:
+            raise ValueError(f"number must be in 1..{self.MAX_KEYS_PER_REQUEST}")
+        if size % 8 or not self.MIN_KEY_SIZE <= size <= self.MAX_KEY_SIZE:
+            raise ValueError("size must be a multiple of 8 within the key size limits")
+
+        material = self.pool.fetch(sae_id, number * size // 8)
+        if material is None:
+            return None
+
+        keys = []
+        with self.issued_lock:
+            for i in range(number):
+                key = material[i * size // 8 : (i + 1) * size // 8]
+                key_id = str(uuid.uuid4())
+                self.issued[key_id] = (sae_id, key)
+                keys.append({"key_ID": key_id, "key": base64.b64encode(key).decode()})
+            while len(self.issued) > self.issued_cache:
+                self.issued.popitem(last=False)
+        return {"keys": keys}
+
+    def dec_keys(self, sae_id, key_ids):
+        # a key can only be redeemed through the SAE it was issued for; a
+        # mismatch looks the same as an unknown key_ID
+        keys = []
+        with self.issued_lock:
+            for key_id in key_ids:
+                if key_id not in self.issued or self.issued[key_id][0] != sae_id:
+                    return None
+            for key_id in key_ids:
+                _, key = self.issued.pop(key_id)
+                keys.append({"key_ID": key_id, "key": base64.b64encode(key).decode()})
+        return {"keys": keys}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, params):
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) != 5 or parts[:3] != ["api", "v1", "keys"]:
+                    return self._send(404, {"message": "Not found"})
+
+                sae_id, action = parts[3], parts[4]
+                if sae_id not in server.pool.stores:
+                    return self._send(404, {"message": f"Unknown SAE: {sae_id}"})
+
+                try:
+                    if action == "status":
+                        return self._send(200, server.status(sae_id))
+                    if action == "enc_keys":
+                        result = server.enc_keys(
+                            sae_id,
+                            int(params.get("number", 1)),
+                            int(params.get("size", server.DEFAULT_KEY_SIZE)),
+                        )
+                        if result is None:
+                            return self._send(
+                                503, {"message": "Insufficient key material"}
+                            )
+                        return self._send(200, result)
+                    if action == "dec_keys":
+                        key_ids = params.get("key_IDs") or [params.get("key_ID")]
+                        result = server.dec_keys(sae_id, [k for k in key_ids if k])
+                        if result is None:
+                            return self._send(400, {"message": "Unknown key_ID"})
+                        return self._send(200, result)
+                except ValueError as e:
+                    return self._send(400, {"message": str(e)})
+
+                return self._send(404, {"message": "Not found"})
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                params = {k: v[0] for k, v in query.items()}
+                if "key_ID" in query:
+                    params["key_IDs"] = query["key_ID"]
+                self._route(params)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    return self._send(400, {"message": "Invalid JSON"})
+                if "key_IDs" in body:
+                    body["key_IDs"] = [k["key_ID"] for k in body["key_IDs"]]
+                self._route(body)
+
+        return Handler
+
+
+def benchmark_key_pool(
+    links,
+    directory,
+    duration=5.0,
+    clients=4,
+    key_size=256,
+    keys_per_request=4,
+    **pool_kwargs,
+):
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+    pool = KeyPool(links, directory, **pool_kwargs)
+    server = KeyServer(pool)
+    pool.start()
+    server.start()
+
+    latencies = []
+    misses = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    sae_ids = list(links)
+
+    def client(i):
+        k = i
+        while time.perf_counter() < deadline:
+            sae_id = sae_ids[k % len(sae_ids)]
+            k += 1
+            url = f"{server.url}/api/v1/keys/{sae_id}/enc_keys?number={keys_per_request}&size={key_size}"
+            t0 = time.perf_counter()
+            try:
+                with urlopen(url) as response:
+                    response.read()
+            except HTTPError as e:
+                if e.code != 503:
+                    raise
+                with lock:
+                    misses[0] += 1
+                time.sleep(0.001)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    throughput = pool.refill_throughput()
+    server.stop()
+    pool.stop()
+
+    lat = np.array(latencies) * 1e3
+    return {
+        "requests": len(lat),
+        "starved_requests": misses[0],
+        "latency_p50_ms": float(np.percentile(lat, 50)) if len(lat) else float("nan"),
+        "latency_p99_ms": float(np.percentile(lat, 99)) if len(lat) else float("nan"),
+        "keys_served": len(lat) * keys_per_request,
+        "refill_bytes_per_s": throughput,
+        "sessions": pool.sessions,
+        "aborted_sessions": pool.aborted,
+    }
+
+
+# %%
+if __name__ == "__main__":
+    import tempfile
+
+    from network import LinkConfig
+
+    links = {f"sae{i}": LinkConfig("kme", f"sae{i}", noise_prob=0.02) for i in range(8)}
+    with tempfile.TemporaryDirectory() as tmp:
+        print(benchmark_key_pool(links, tmp, duration=3.0, capacity=1 << 16))
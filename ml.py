@@ -1,7 +1,13 @@
 import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.linear_model import LogisticRegression
 from bb84_protocol import BB84Protocol
+from replay import replay_archives
+
+FEATURES = ["error_rate", "sift_ratio"]
+# analyzer DataFrames use display names for the same features
+FEATURE_ALIASES = {"QBER": "error_rate", "Sift Ratio": "sift_ratio"}
 
 
 class MLDetector:
@@ -9,7 +15,7 @@ class MLDetector:
         self.model = None
         self.is_trained = False
 
-    def generate_training_data(self, n_sessions=50, n_qubits=50):
+    def generate_training_data(self, n_sessions=50, n_qubits=50, progress=None):
         data = []
 
         for _ in range(n_sessions):
@@ -20,6 +26,8 @@ class MLDetector:
             data.append(
                 {"error_rate": qber, "sift_ratio": key_len / n_qubits, "eve": 0}
             )
+            if progress is not None:
+                progress(len(data) / (2 * n_sessions))
 
         for _ in range(n_sessions):
             bb84 = BB84Protocol(n_qubits)
@@ -32,13 +40,15 @@ class MLDetector:
             data.append(
                 {"error_rate": qber, "sift_ratio": key_len / n_qubits, "eve": 1}
             )
+            if progress is not None:
+                progress(len(data) / (2 * n_sessions))
 
         return pd.DataFrame(data)
 
-    def train(self, n_sessions=50, n_qubits=50):
-        df = self.generate_training_data(n_sessions, n_qubits)
+    def train(self, n_sessions=50, n_qubits=50, progress=None):
+        df = self.generate_training_data(n_sessions, n_qubits, progress)
 
-        X = df[["error_rate", "sift_ratio"]]
+        X = df[FEATURES].to_numpy()
         y = df["eve"]
 
         self.model = LogisticRegression(random_state=42)
@@ -51,17 +61,78 @@ class MLDetector:
         if not self.is_trained:
             raise ValueError("Model not trained. Call train() first.")
 
-        features = [[qber, sift_ratio]]
-        prediction = self.model.predict(features)[0]
-        probability = self.model.predict_proba(features)[0, 1]
+        predictions, probabilities = self.predict_batch([qber], [sift_ratio])
+        return predictions[0], probabilities[0]
+
+    def predict_batch(self, features, sift_ratio=None, chunk_size=1_000_000, n_jobs=1):
+        if not self.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+
+        X = self._feature_matrix(features, sift_ratio)
+        predictions = np.empty(len(X), dtype=self.model.classes_.dtype)
+        probabilities = np.empty(len(X))
+
+        def score(start):
+            chunk = X[start : start + chunk_size]
+            # one predict_proba per chunk, labels follow from the argmax
+            proba = self.model.predict_proba(chunk)
+            predictions[start : start + len(chunk)] = self.model.classes_[
+                proba.argmax(axis=1)
+            ]
+            probabilities[start : start + len(chunk)] = proba[:, 1]
+
+        starts = range(0, len(X), chunk_size)
+        if n_jobs == 1 or len(starts) <= 1:
+            for start in starts:
+                score(start)
+        else:
+            # chunks write disjoint slices, so threads need no locking
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                list(pool.map(score, starts))
+
+        return predictions, probabilities
+
+    @staticmethod
+    def _feature_matrix(features, sift_ratio=None):
+        if isinstance(features, pd.DataFrame):
+            df = features.rename(columns=FEATURE_ALIASES)
+            missing = [c for c in FEATURES if c not in df.columns]
+            if missing:
+                raise ValueError(f"Missing feature columns: {missing}")
+            return df[FEATURES].to_numpy(dtype=float)
+
+        if sift_ratio is not None:
+            return np.column_stack(
+                [np.asarray(features, dtype=float), np.asarray(sift_ratio, dtype=float)]
+            )
+
+        X = np.asarray(features, dtype=float)
+        if X.ndim != 2 or X.shape[1] != len(FEATURES):
+            raise ValueError(
+                f"Expected an (n, {len(FEATURES)}) array of {FEATURES}, got shape {X.shape}"
+            )
+        return X
+
+    def replay(
+        self,
+        paths,
+        threshold=0.11,
+        max_rounds=None,
+        chunk_sessions=1 << 16,
+        workers=None,
+    ):
+        if not self.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
 
-        return prediction, probability
+        return replay_archives(
+            paths, threshold, max_rounds, chunk_sessions, detector=self, workers=workers
+        )
 
     def evaluate_scenarios(self, scenarios, n_qubits=50):
         if not self.is_trained:
             raise ValueError("Model not trained. Call train() first.")
 
-        results = []
+        names, qbers, sift_ratios = [], [], []
 
         for name, eve_cfg in scenarios:
             bb84 = BB84Protocol(n_qubits)
@@ -73,16 +144,18 @@ class MLDetector:
                 bb84.send_qubit(eve_intercepts=eve_intercepts, eve_basis=eve_basis)
 
             qber, key_len = bb84.calculate_qber()
-            prediction, probability = self.predict(qber, key_len / n_qubits)
-
-            results.append(
-                {
-                    "Scenario": name,
-                    "QBER": qber,
-                    "Sift Ratio": key_len / n_qubits,
-                    "ML Confidence": probability,
-                    "Prediction": "EVE DETECTED" if prediction == 1 else "SECURE",
-                }
-            )
-
-        return pd.DataFrame(results)
+            names.append(name)
+            qbers.append(qber)
+            sift_ratios.append(key_len / n_qubits)
+
+        predictions, probabilities = self.predict_batch(qbers, sift_ratios)
+
+        return pd.DataFrame(
+            {
+                "Scenario": names,
+                "QBER": qbers,
+                "Sift Ratio": sift_ratios,
+                "ML Confidence": probabilities,
+                "Prediction": np.where(predictions == 1, "EVE DETECTED", "SECURE"),
+            }
+        )
@@ -0,0 +1,217 @@
+# %%
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from bb84_protocol import EveConfig, simulate_session
+
+
+@dataclass
+class LinkConfig:
+    node_a: str
+    node_b: str
+    noise_prob: float = 0.0
+    eve_config: EveConfig = field(default_factory=EveConfig)
+    pulse_rate: float = 1e6  # qubits per simulated second
+    block_size: int = 4096
+    threshold: float = 0.11
+    buffer_bits: int = 1 << 20
+
+
+class KeyBuffer:
+    # bounded ring buffer of key bits, overflow is counted and dropped
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.bits = np.zeros(capacity, dtype=np.uint8)
+        self.start = 0
+        self.level = 0
+        self.dropped = 0
+
+    def push(self, bits):
+        n = min(len(bits), self.capacity - self.level)
+        self.dropped += len(bits) - n
+        if n == 0:
+            return 0
+
+        end = (self.start + self.level) % self.capacity
+        first = min(n, self.capacity - end)
+        self.bits[end : end + first] = bits[:first]
+        self.bits[: n - first] = bits[first:n]
+        self.level += n
+        return n
+
+    def pop(self, n):
+        if n > self.level:
+            return None
+
+        idx = (self.start + np.arange(n)) % self.capacity
+        bits = self.bits[idx]
+        self.start = (self.start + n) % self.capacity
+        self.level -= n
+        return bits
+
+
+class QKDLink:
+
+    def __init__(self, link_id, config, seed=None):
+        self.link_id = link_id
+        self.config = config
+        self.buffer = KeyBuffer(config.buffer_bits)
+        self.rng = np.random.default_rng(seed)
+        self.sim_time = 0.0
+        self.qubits_sent = 0
+        self.blocks = 0
+        self.aborted_blocks = 0
+        self.key_bits = 0
+        self.qber_sum = 0.0
+
+    def run_block(self):
+        cfg = self.config
+        rounds = simulate_session(
+            cfg.block_size, cfg.eve_config, cfg.noise_prob, self.rng
+        )
+        qber, sifted_len = rounds.qber()
+
+        self.blocks += 1
+        self.qubits_sent += cfg.block_size
+        self.qber_sum += qber
+        self.sim_time += cfg.block_size / cfg.pulse_rate
+
+        if qber > cfg.threshold:
+            self.aborted_blocks += 1
+            return 0
+
+        key = rounds.sifted_key()
+        self.key_bits += len(key)
+        self.buffer.push(key)
+        return len(key)
+
+    def stats(self):
+        return {
+            "Link": self.link_id,
+            "Node A": self.config.node_a,
+            "Node B": self.config.node_b,
+            "Blocks": self.blocks,
+            "Aborted": self.aborted_blocks,
+            "Mean QBER": self.qber_sum / self.blocks if self.blocks else 0.0,
+            "Key Bits": self.key_bits,
+            "Buffered": self.buffer.level,
+            "Dropped": self.buffer.dropped,
+            "Key Rate (bit/s)": (
+                self.key_bits / self.sim_time if self.sim_time > 0 else 0.0
+            ),
+        }
+
+
+class QKDNetwork:
+
+    def __init__(self, seed=None):
+        self.nodes = set()
+        self.links = {}
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.wall_time = 0.0
+        self.duration = 0.0
+
+    def add_node(self, name):
+        self.nodes.add(name)
+
+    def add_link(self, config, link_id=None):
+        for node in (config.node_a, config.node_b):
+            if node not in self.nodes:
+                raise ValueError(f"Unknown node: {node}")
+
+        if link_id is None:
+            link_id = f"{config.node_a}-{config.node_b}-{len(self.links)}"
+        if link_id in self.links:
+            raise ValueError(f"Duplicate link: {link_id}")
+
+        # independent, reproducible stream per link
+        seed = self.seed_seq.spawn(1)[0]
+        self.links[link_id] = QKDLink(link_id, config, seed)
+        return self.links[link_id]
+
+    async def _drive_link(self, link, duration, time_scale):
+        # duration is relative, so repeated runs keep extending the simulation
+        end = link.sim_time + duration
+        while link.sim_time < end:
+            link.run_block()
+            # yield after every block so links interleave; with time_scale > 0
+            # buffers also fill in wall-clock time at the simulated rate
+            block_time = link.config.block_size / link.config.pulse_rate
+            await asyncio.sleep(block_time * time_scale)
+
+    async def run_async(self, duration, time_scale=0.0):
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                self._drive_link(link, duration, time_scale)
+                for link in self.links.values()
+            )
+        )
+        self.wall_time += time.perf_counter() - start
+        self.duration += duration
+
+    def run(self, duration, time_scale=0.0):
+        asyncio.run(self.run_async(duration, time_scale))
+        return self.report()
+
+    def link_report(self):
+        return pd.DataFrame([link.stats() for link in self.links.values()])
+
+    def node_report(self):
+        df = self.link_report()
+        if df.empty:
+            return pd.DataFrame(columns=["Node", "Links", "Key Bits"])
+
+        ends = pd.concat(
+            [
+                df[["Node A", "Key Bits"]].rename(columns={"Node A": "Node"}),
+                df[["Node B", "Key Bits"]].rename(columns={"Node B": "Node"}),
+            ]
+        )
+        return (
+            ends.groupby("Node")
+            .agg(**{"Links": ("Key Bits", "size"), "Key Bits": ("Key Bits", "sum")})
+            .reset_index()
+        )
+
+    def report(self):
+        key_bits = sum(link.key_bits for link in self.links.values())
+        qubits = sum(link.qubits_sent for link in self.links.values())
+
+        return {
+            "links": len(self.links),
+            "nodes": len(self.nodes),
+            "qubits_sent": qubits,
+            "key_bits": key_bits,
+            "sim_duration": self.duration,
+            "wall_time": self.wall_time,
+            "network_key_rate": key_bits / self.duration if self.duration else 0.0,
+            "qubits_per_wall_second": (
+                qubits / self.wall_time if self.wall_time else 0.0
+            ),
+        }
+
+
+# %%
+if __name__ == "__main__":
+    net = QKDNetwork(seed=1)
+    for i in range(50):
+        net.add_node(f"n{i}")
+
+    rng = np.random.default_rng(2)
+    for i in range(1000):
+        a, b = rng.choice(50, size=2, replace=False)
+        eve = EveConfig(active=bool(i % 10 == 0), intercept_rate=0.5)
+        net.add_link(
+            LinkConfig(
+                f"n{a}", f"n{b}", noise_prob=rng.uniform(0, 0.05), eve_config=eve
+            )
+        )
+
+    print(net.run(duration=0.05))
+    print(net.link_report().head())
@@ -0,0 +1,144 @@
+# %%
+from dataclasses import dataclass
+
+import numpy as np
+
+from bb84_protocol import EveConfig, SessionRounds, measure_states, simulate_session
+
+SIX_STATE_BASES = np.array(["Z", "X", "Y"])
+
+
+def binary_entropy(p):
+    p = np.clip(np.asarray(p, dtype=float), 1e-12, 1 - 1e-12)
+    return -p * np.log2(p) - (1 - p) * np.log2(1 - p)
+
+
+@dataclass
+class B92Rounds(SessionRounds):
+    # Bob keeps only conclusive outcomes, so sifting is not a basis match
+    conclusive: np.ndarray
+
+    def sift_mask(self):
+        return self.conclusive
+
+
+class BB84:
+    name = "BB84"
+    n_bases = 2
+    sift_probability = 1 / 2
+    # QBER caused by intercepting every qubit in a random basis
+    intercept_qber = 1 / 4
+
+    def simulate(
+        self, n_rounds, eve_config=None, noise_prob=0.0, rng=None, n_sessions=None
+    ):
+        return simulate_session(
+            n_rounds, eve_config, noise_prob, rng, n_sessions, self.n_bases
+        )
+
+    @staticmethod
+    def secret_fraction(qber):
+        # Shor-Preskill, asymptotic one-way post-processing
+        return np.maximum(0.0, 1 - 2 * binary_entropy(qber))
+
+
+class SixState(BB84):
+    name = "Six-State"
+    n_bases = 3
+    sift_probability = 1 / 3
+    intercept_qber = 1 / 3
+
+    @staticmethod
+    def secret_fraction(qber):
+        # Lo (2001): 1 - S of the Bell-diagonal state (1 - 3Q/2, Q/2, Q/2, Q/2)
+        q = np.clip(np.asarray(qber, dtype=float), 1e-12, 2 / 3 - 1e-12)
+        entropy = -(1 - 1.5 * q) * np.log2(1 - 1.5 * q) - 1.5 * q * np.log2(q / 2)
+        return np.maximum(0.0, 1 - entropy)
+
+
+class B92:
+    # bit 0 is sent as |0> (Z), bit 1 as |+> (X); Bob measures in a random
+    # basis and keeps the orthogonal outcome, which rules out one of the states
+    name = "B92"
+    n_bases = 2
+    sift_probability = 1 / 4
+    intercept_qber = 1 / 3
+
+    def simulate(
+        self, n_rounds, eve_config=None, noise_prob=0.0, rng=None, n_sessions=None
+    ):
+        if rng is None:
+            rng = np.random.default_rng()
+        if eve_config is None:
+            eve_config = EveConfig(active=False)
+        shape = n_rounds if n_sessions is None else (n_sessions, n_rounds)
+
+        alice_bits = rng.integers(0, 2, size=shape, dtype=np.uint8)
+        bob_bases = rng.integers(0, 2, size=shape, dtype=np.uint8)
+        state_bits = np.zeros(shape, dtype=np.uint8)
+
+        if eve_config.active:
+            eve_mask = rng.random(shape) < eve_config.intercept_rate
+        else:
+            eve_mask = np.zeros(shape, dtype=bool)
+        eve_bases = rng.integers(0, 2, size=shape, dtype=np.uint8)
+        eve_bits = measure_states(alice_bits, state_bits, eve_bases, rng)
+
+        channel_bases = np.where(eve_mask, eve_bases, alice_bits)
+        channel_bits = np.where(eve_mask, eve_bits, state_bits)
+        outcome = measure_states(channel_bases, channel_bits, bob_bases, rng)
+        if noise_prob > 0:
+            outcome ^= (rng.random(shape) < noise_prob).astype(np.uint8)
+
+        # a 1 in Z excludes |0>, a 1 in X excludes |+>
+        return B92Rounds(
+            alice_bits=alice_bits,
+            alice_bases=alice_bits,
+            bob_bases=bob_bases,
+            bob_bits=(1 - bob_bases).astype(np.uint8),
+            eve_mask=eve_mask,
+            eve_bases=np.where(eve_mask, eve_bases, 0).astype(np.uint8),
+            eve_bits=np.where(eve_mask, eve_bits, 0).astype(np.uint8),
+            conclusive=outcome == 1,
+        )
+
+    @staticmethod
+    def secret_fraction(qber):
+        # optimistic: BB84's bound, valid only for a lossless single-photon
+        # channel where Eve cannot exploit inconclusive results
+        return BB84.secret_fraction(qber)
+
+
+PROTOCOLS = {p.name: p for p in (BB84(), SixState(), B92())}
+
+
+def get_protocol(name):
+    if name not in PROTOCOLS:
+        raise ValueError(f"Unknown protocol: {name}. Choose from {list(PROTOCOLS)}")
+    return PROTOCOLS[name]
+
+
+def sweep(protocol, n_rounds, eve_config=None, noise_prob=0.0, rng=None, chunk=1 << 20):
+    # sifted and error counts over n_rounds, simulated chunk rounds at a time
+    sifted = errors = 0
+    for start in range(0, n_rounds, chunk):
+        rounds = protocol.simulate(
+            min(chunk, n_rounds - start), eve_config, noise_prob, rng
+        )
+        mask = rounds.sift_mask()
+        sifted += int(mask.sum())
+        errors += int(((rounds.alice_bits != rounds.bob_bits) & mask).sum())
+    return sifted, errors
+
+
+# %%
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for protocol in PROTOCOLS.values():
+        for eve in (EveConfig(), EveConfig(active=True, intercept_rate=1.0)):
+            sifted, errors = sweep(protocol, 1_000_000, eve, rng=rng)
+            print(
+                f"{protocol.name:9s} eve={eve.active!s:5s} "
+                f"sift={sifted / 1e6:.3f} (expected {protocol.sift_probability:.3f}) "
+                f"qber={errors / sifted:.3f}"
+            )
@@ -0,0 +1,219 @@
+# %%
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from bb84_protocol import EveConfig, simulate_rounds
+
+
+class BitSource:
+    # Packed random bits drawn 64 at a time from a bit generator's raw stream
+    # into a refillable byte buffer. Every draw is charged to a consumer, and
+    # requests are byte aligned, so up to 7 bits per request are discarded.
+
+    def __init__(self, rng=None, buffer_bytes=1 << 20):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.bit_generator = rng.bit_generator
+        self.buffer_bytes = buffer_bytes
+        self.buffer = np.empty(0, dtype=np.uint8)
+        self.pos = 0
+        self.generated = 0
+        self.refills = 0
+        self.discarded = 0
+        self.used = defaultdict(int)
+
+    def _refill(self, n_bytes):
+        words = self.bit_generator.random_raw(-(-n_bytes // 8))
+        return words.view(np.uint8)
+
+    def take(self, n_bytes, consumer="default"):
+        if self.pos + n_bytes > len(self.buffer):
+            fresh = self._refill(max(self.buffer_bytes, n_bytes))
+            self.buffer = np.concatenate([self.buffer[self.pos :], fresh])
+            self.pos = 0
+            self.generated += 8 * len(fresh)
+            self.refills += 1
+            if len(self.buffer) < n_bytes:
+                raise ValueError(f"{type(self).__name__} exhausted")
+        data = self.buffer[self.pos : self.pos + n_bytes]
+        self.pos += n_bytes
+        self.used[consumer] += 8 * n_bytes
+        return data
+
+    def bits(self, n, consumer="default"):
+        data = self.take(-(-n // 8), consumer)
+        self.discarded += 8 * len(data) - n
+        self.used[consumer] -= 8 * len(data) - n
+        return np.unpackbits(data, count=n)
+
+    def uniform(self, n, consumer="default"):
+        # 53-bit doubles in [0, 1), 64 bits each
+        words = self.take(8 * n, consumer).view(np.uint64)
+        return (words >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def integers(self, high, n, consumer="default"):
+        # uniform on [0, high): ceil(log2(high)) bits per draw, rejecting
+        # values >= high (only non powers of two reject anything)
+        if high == 2:
+            return self.bits(n, consumer)
+        k = max(int(high - 1).bit_length(), 1)
+        weights = (1 << np.arange(k - 1, -1, -1)).astype(np.uint8)
+        out = np.empty(0, dtype=np.uint8)
+        while len(out) < n:
+            need = n - len(out)
+            draw = int(need * (1 << k) / high) + 8
+            values = self.bits(draw * k, consumer).reshape(draw, k) @ weights
+            out = np.concatenate([out, values[values < high][:need]])
+        return out.astype(np.uint8)
+
+    def view(self, consumer):
+        return SourceView(self, consumer)
+
+    def report(self):
+        return {
+            "generated_bits": self.generated,
+            "refills": self.refills,
+            "discarded_bits": self.discarded,
+            **{f"{name}_bits": bits for name, bits in self.used.items()},
+        }
+
+
+class SourceView:
+    # the subset of numpy.random.Generator the vectorized engine calls,
+    # charged to one consumer
+
+    def __init__(self, source, consumer):
+        self.source = source
+        self.consumer = consumer
+
+    def integers(self, low, high, size=None, dtype=np.int64):
+        n = int(np.prod(size)) if size is not None else 1
+        values = low + self.source.integers(high - low, n, self.consumer)
+        return values.astype(dtype).reshape(() if size is None else size)
+
+    def random(self, size=None):
+        n = int(np.prod(size)) if size is not None else 1
+        values = self.source.uniform(n, self.consumer)
+        return values.reshape(() if size is None else size)
+
+
+class FileBitSource(BitSource):
+    # stand-in for a hardware QRNG: bytes come from a file and are never
+    # reused, so running past its end is an error
+
+    def __init__(self, path, buffer_bytes=1 << 20):
+        super().__init__(None, buffer_bytes)
+        self.path = path
+        self.file = open(path, "rb")
+
+    def _refill(self, n_bytes):
+        return np.frombuffer(self.file.read(n_bytes), dtype=np.uint8)
+
+    def close(self):
+        self.file.close()
+
+
+def write_qrng_file(path, n_bytes, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    with open(path, "wb") as f:
+        for start in range(0, n_bytes, 1 << 24):
+            f.write(rng.bytes(min(1 << 24, n_bytes - start)))
+    return path
+
+
+def simulate_with_source(n_qubits, source, eve_config=None, noise_prob=0.0, n_bases=2):
+    # simulate_rounds with every draw charged to the party that makes it; the
+    # channel owns Bob's wrong-basis outcomes and the noise
+    alice, bob = source.view("alice"), source.view("bob")
+    alice_bits = alice.integers(0, 2, n_qubits, dtype=np.uint8)
+    alice_bases = alice.integers(0, n_bases, n_qubits, dtype=np.uint8)
+    bob_bases = bob.integers(0, n_bases, n_qubits, dtype=np.uint8)
+    return simulate_rounds(
+        alice_bits,
+        alice_bases,
+        bob_bases,
+        eve_config,
+        noise_prob,
+        source.view("channel"),
+        n_bases,
+        eve_rng=source.view("eve"),
+    )
+
+
+def benchmark_sources(n_bits=10_000_000, sources=None):
+    # bits/s delivered to each party's typical draw, for each source
+    if sources is None:
+        sources = {"generator": BitSource()}
+    rows = []
+    for name, source in sources.items():
+        draws = {
+            "alice": lambda s: (s.bits(n_bits, "alice"), s.bits(n_bits, "alice")),
+            "bob": lambda s: s.bits(n_bits, "bob"),
+            "eve": lambda s: (
+                s.uniform(n_bits // 64, "eve"),
+                s.bits(n_bits, "eve"),
+            ),
+            "channel": lambda s: s.uniform(n_bits // 64, "channel"),
+        }
+        for consumer, draw in draws.items():
+            before = source.used[consumer]
+            start = time.perf_counter()
+            draw(source)
+            elapsed = time.perf_counter() - start
+            bits = source.used[consumer] - before
+            rows.append(
+                {
+                    "Source": name,
+                    "Consumer": consumer,
+                    "Bits": bits,
+                    "Bits/s": bits / elapsed,
+                }
+            )
+
+    # the scalar and unicode draws reset() and the per-round code use
+    start = time.perf_counter()
+    np.random.randint(0, 2, n_bits)
+    rows.append(
+        {
+            "Source": "np.random.randint",
+            "Consumer": "baseline",
+            "Bits": n_bits,
+            "Bits/s": n_bits / (time.perf_counter() - start),
+        }
+    )
+    start = time.perf_counter()
+    np.random.choice(["Z", "X"], n_bits)
+    rows.append(
+        {
+            "Source": "np.random.choice",
+            "Consumer": "baseline",
+            "Bits": n_bits,
+            "Bits/s": n_bits / (time.perf_counter() - start),
+        }
+    )
+    return rows
+
+
+# %%
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    path = write_qrng_file(
+        os.path.join(tempfile.gettempdir(), "qrng_standin.bin"), 1 << 26
+    )
+    sources = {"generator": BitSource(), "qrng file": FileBitSource(path)}
+    for row in benchmark_sources(sources=sources):
+        print(
+            f"{row['Source']:18s} {row['Consumer']:8s} {row['Bits/s'] / 1e6:10.1f} Mbit/s"
+        )
+
+    source = BitSource(np.random.default_rng(0))
+    rounds = simulate_with_source(
+        1_000_000, source, EveConfig(active=True, intercept_rate=0.5), 0.01
+    )
+    print(f"qber {rounds.qber()[0]:.3f}", source.report())
+    sources["qrng file"].close()
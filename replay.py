@@ -0,0 +1,98 @@
+# %%
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from archive import COLUMNS, SessionArchive, packed_bytes, packed_qber
+
+
+def _uniform_runs(index):
+    # split an index slice into runs that share a length and are stored back
+    # to back, each run is one zero-copy packed block
+    n_rounds = index["n_rounds"].astype(np.int64)
+    offsets = index["offset"].astype(np.int64)
+    session_bytes = len(COLUMNS) * packed_bytes(n_rounds)
+    breaks = (n_rounds[1:] != n_rounds[:-1]) | (
+        offsets[1:] - offsets[:-1] != session_bytes[:-1]
+    )
+    edges = np.concatenate([[0], np.flatnonzero(breaks) + 1, [len(index)]])
+    return zip(edges[:-1], edges[1:])
+
+
+def _chunk_counts(archive, start, stop, max_rounds):
+    index = archive.index[start:stop]
+    n_rounds = index["n_rounds"].astype(np.int64)
+    if max_rounds is not None:
+        n_rounds = np.minimum(n_rounds, max_rounds)
+
+    errors = np.empty(len(index), dtype=np.int64)
+    sifted = np.empty(len(index), dtype=np.int64)
+    for lo, hi in _uniform_runs(index):
+        block = archive.packed_block(start + lo, start + hi)
+        errors[lo:hi], sifted[lo:hi] = packed_qber(block, int(n_rounds[lo]))
+    return errors, sifted, n_rounds
+
+
+def iter_replay(path, threshold=0.11, max_rounds=None, chunk_sessions=1 << 16):
+    # streams per-session metrics recomputed from the stored rounds
+    archive = SessionArchive(path)
+
+    for start in range(0, len(archive), chunk_sessions):
+        stop = min(start + chunk_sessions, len(archive))
+        errors, sifted, n_rounds = _chunk_counts(archive, start, stop, max_rounds)
+        index = archive.index[start:stop]
+
+        qber = np.divide(errors, sifted, out=np.zeros(len(errors)), where=sifted > 0)
+        yield pd.DataFrame(
+            {
+                "QBER": qber,
+                "Key Length": sifted,
+                "Sift Ratio": sifted / np.maximum(n_rounds, 1),
+                "Eve Present": np.where(index["eve_rate"] > 0, "Yes", "No"),
+                "Detection": np.where(qber > threshold, "High risk", "Acceptable"),
+            }
+        )
+
+
+def replay_file(
+    path, threshold=0.11, max_rounds=None, chunk_sessions=1 << 16, detector=None
+):
+    chunks = []
+    for df in iter_replay(path, threshold, max_rounds, chunk_sessions):
+        if detector is not None:
+            predictions, probabilities = detector.predict_batch(df)
+            df["ML Confidence"] = probabilities
+            df["Prediction"] = np.where(predictions == 1, "EVE DETECTED", "SECURE")
+        chunks.append(df)
+
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
+    df.insert(0, "File", os.path.basename(path))
+    return df
+
+
+def replay_archives(
+    paths,
+    threshold=0.11,
+    max_rounds=None,
+    chunk_sessions=1 << 16,
+    detector=None,
+    workers=None,
+):
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    args = [(p, threshold, max_rounds, chunk_sessions, detector) for p in paths]
+
+    if workers == 1 or len(paths) <= 1:
+        frames = [replay_file(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(replay_file, *zip(*args)))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,119 @@
+# %%
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from game import DIFFICULTY_THRESHOLDS
+from kernels import RANDOM_BASIS, X_BASIS, Z_BASIS, RoundDraws, play_rounds
+
+BASIS_POLICIES = {"random": RANDOM_BASIS, "Z": Z_BASIS, "X": X_BASIS}
+
+
+def policy_grid(rates=None, qber_caps=None, bases=("random",)):
+    # each candidate intercepts with probability `rate` while the QBER Eve can
+    # observe stays at or below `qber_cap` (inf = fixed-rate policy)
+    if rates is None:
+        rates = np.linspace(0.0, 1.0, 41)
+    if qber_caps is None:
+        qber_caps = np.r_[np.inf, np.linspace(0.0, 0.2, 21)]
+
+    rate, cap, basis = np.meshgrid(rates, qber_caps, list(bases), indexing="ij")
+    return pd.DataFrame(
+        {
+            "Rate": rate.ravel().astype(float),
+            "QBER Cap": cap.ravel().astype(float),
+            "Basis": basis.ravel(),
+        }
+    )
+
+
+def _simulate(rate, cap, basis, thresholds, n_qubits, n_seeds, seed):
+    # Monte Carlo of BB84Game for P policies x n_seeds games on the per-round
+    # kernel (Numba when installed). All policies share the same random draws.
+    rng = np.random.default_rng(seed)
+    shape = (len(rate), n_seeds)
+    draws = RoundDraws.draw(n_qubits, n_seeds, rng)
+    sifted, errors, intercepted = play_rounds(draws, rate, cap, basis)
+
+    qber = np.divide(errors, sifted, out=np.zeros(shape), where=sifted > 0)
+    results = {}
+    for name, threshold in thresholds.items():
+        detected = qber > threshold
+        score = np.where(detected, -100, intercepted * 10)
+        win = ~detected & (intercepted > 0)
+        results[name] = (
+            win.sum(axis=1),
+            score.sum(axis=1, dtype=np.int64),
+            detected.sum(axis=1),
+        )
+    return results, intercepted.sum(axis=1, dtype=np.int64)
+
+
+def optimize_strategies(
+    n_qubits=20,
+    thresholds=None,
+    policies=None,
+    n_seeds=4000,
+    workers=None,
+    chunk_seeds=500,
+    seed=None,
+):
+    if thresholds is None:
+        thresholds = DIFFICULTY_THRESHOLDS
+    if policies is None:
+        policies = policy_grid()
+
+    rate = policies["Rate"].to_numpy(dtype=float)
+    cap = policies["QBER Cap"].to_numpy(dtype=float)
+    basis = policies["Basis"].map(BASIS_POLICIES).to_numpy(dtype=np.int8)
+
+    chunks = [chunk_seeds] * (n_seeds // chunk_seeds)
+    if n_seeds % chunk_seeds:
+        chunks.append(n_seeds % chunk_seeds)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [
+        (rate, cap, basis, thresholds, n_qubits, k, s) for k, s in zip(chunks, seeds)
+    ]
+
+    if workers == 1 or len(chunks) == 1:
+        parts = [_simulate(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            parts = list(pool.map(_simulate, *zip(*args)))
+
+    intercepted = sum(p[1] for p in parts)
+    frames = []
+    for name in thresholds:
+        wins = sum(p[0][name][0] for p in parts)
+        scores = sum(p[0][name][1] for p in parts)
+        detections = sum(p[0][name][2] for p in parts)
+
+        df = policies.copy()
+        df.insert(0, "Difficulty", name)
+        df["Threshold"] = thresholds[name]
+        df["Win Probability"] = wins / n_seeds
+        df["Expected Score"] = scores / n_seeds
+        df["Detection Probability"] = detections / n_seeds
+        df["Intercepted Fraction"] = intercepted / (n_seeds * n_qubits)
+        frames.append(df)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def best_strategies(results, by="Expected Score"):
+    idx = results.groupby("Difficulty", sort=False)[by].idxmax()
+    return results.loc[idx].reset_index(drop=True)
+
+
+# %%
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    results = optimize_strategies(n_qubits=20, n_seeds=4000, seed=0)
+    print(
+        f"{len(results)} policy/difficulty pairs in {time.perf_counter() - start:.1f}s"
+    )
+    print(best_strategies(results).to_string(index=False))
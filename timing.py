@@ -0,0 +1,333 @@
+# %%
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from bb84_protocol import EveConfig, simulate_session
+from protocols import binary_entropy
+
+SPEED_OF_LIGHT = 299_792_458.0  # m/s
+FIBRE_INDEX = 1.468
+
+
+@dataclass
+class TimingConfig:
+    pulse_rate: float = 1e9  # pulses per second
+    distance_km: float = 25.0
+    loss_db_per_km: float = 0.2
+    detector_efficiency: float = 0.2
+    dark_count_prob: float = 1e-6  # per pulse
+    dead_time: float = 50e-9  # seconds, non-paralyzable
+    noise_prob: float = 0.01
+    eve_config: EveConfig = field(default_factory=EveConfig)
+    pulses_per_batch: int = 1_000_000
+    classical_latency: float = 1e-4  # processing per classical message, seconds
+    classical_bandwidth: float = 1e8  # bits per second
+    sift_bits_per_click: int = 2
+    ec_block_bits: int = 100_000  # sifted bits per reconciliation block
+    ec_passes: int = 4  # classical round trips per block (Cascade-like)
+    ec_efficiency: float = 1.16  # leaked bits / Shannon limit
+    ec_throughput: float = 5e7  # bits per second
+    pa_throughput: float = 1e8  # bits per second
+    threshold: float = 0.11
+
+    @property
+    def fibre_delay(self):
+        return self.distance_km * 1e3 * FIBRE_INDEX / SPEED_OF_LIGHT
+
+    @property
+    def rtt(self):
+        return 2 * self.fibre_delay + self.classical_latency
+
+    @property
+    def click_prob(self):
+        transmittance = 10 ** (-self.loss_db_per_km * self.distance_km / 10)
+        signal = self.detector_efficiency * transmittance
+        return 1 - (1 - signal) * (1 - self.dark_count_prob)
+
+    @property
+    def dark_fraction(self):
+        signal = 1 - (1 - self.click_prob) / (1 - self.dark_count_prob)
+        return self.dark_count_prob * (1 - signal) / self.click_prob
+
+    @property
+    def blind_pulses(self):
+        # pulses after a click that fall inside the dead time
+        return max(int(np.ceil(self.dead_time * self.pulse_rate)) - 1, 0)
+
+
+class Stage:
+    # single-server FIFO resource; utilization is what identifies the
+    # bottleneck of the pipeline
+
+    def __init__(self, name):
+        self.name = name
+        self.queue = deque()
+        self.busy = False
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.jobs = 0
+        self.max_queue = 0
+
+    def stats(self, elapsed):
+        return {
+            "Stage": self.name,
+            "Jobs": self.jobs,
+            "Busy (s)": self.busy_time,
+            "Utilization": self.busy_time / elapsed if elapsed else 0.0,
+            "Mean Wait (s)": self.wait_time / self.jobs if self.jobs else 0.0,
+            "Max Queue": self.max_queue,
+            "Backlog": len(self.queue),
+        }
+
+
+class TimingSimulator:
+    # Heap-scheduled pipeline: pulse batches -> fibre -> detection (dead time)
+    # -> sifting round trip -> error correction -> privacy amplification.
+    # Events are per batch and per classical job; the pulses and clicks inside
+    # a batch are handled vectorized, so 10^8+ pulses cost a few thousand heap
+    # operations.
+
+    def __init__(self, config=None, seed=None):
+        self.config = config or TimingConfig()
+        self.rng = np.random.default_rng(seed)
+        self.events = []
+        self._seq = itertools.count()
+        self.now = 0.0
+        self.n_events = 0
+        self.stages = {
+            name: Stage(name)
+            for name in ("detection", "sifting", "reconciliation", "amplification")
+        }
+
+        self.next_free_pulse = 0
+        self.pulses = 0
+        self.clicks = 0
+        self.sifted_bits = 0
+        self.pending_sifted = 0
+        self.pending_errors = 0
+        self.secure_bits = 0
+        self.aborted_blocks = 0
+        self.first_key_time = None
+        self.key_log = []  # (time, secure bits) per amplified block
+
+    def schedule(self, delay, handler, *args):
+        heapq.heappush(self.events, (self.now + delay, next(self._seq), handler, args))
+
+    def _submit(self, stage_name, service, on_done, *args):
+        stage = self.stages[stage_name]
+        stage.max_queue = max(stage.max_queue, len(stage.queue) + stage.busy)
+        stage.queue.append((self.now, service, on_done, args))
+        if not stage.busy:
+            self._start(stage)
+
+    def _start(self, stage):
+        submitted, service, on_done, args = stage.queue.popleft()
+        stage.busy = True
+        stage.jobs += 1
+        stage.wait_time += self.now - submitted
+        stage.busy_time += service
+        self.schedule(service, self._finish, stage, on_done, args)
+
+    def _finish(self, stage, on_done, args):
+        stage.busy = False
+        if stage.queue:
+            self._start(stage)
+        on_done(*args)
+
+    def _detect(self, start, n_pulses):
+        # Non-paralyzable dead time on Bernoulli clicks is a renewal process:
+        # each kept click is followed by `blind` dead pulses and a geometric
+        # wait for the next one.
+        cfg = self.config
+        p, blind = cfg.click_prob, cfg.blind_pulses
+        end = start + n_pulses
+
+        clicks = []
+        free = max(self.next_free_pulse, start)
+        while free < end:
+            expected = int((end - free) / (blind + 1 / p)) + 16
+            gaps = self.rng.geometric(p, size=int(expected * 1.1))
+            pos = free - 1 + np.cumsum(gaps + blind) - blind
+            clicks.append(pos[pos < end])
+            if pos[-1] < end:
+                free = pos[-1] + 1 + blind
+            else:
+                kept = clicks[-1]
+                free = kept[-1] + 1 + blind if len(kept) else end
+                break
+        self.next_free_pulse = free
+        return int(sum(len(c) for c in clicks))
+
+    def _on_batch_arrival(self, start, n_pulses):
+        n_clicks = self._detect(start, n_pulses)
+        self.clicks += n_clicks
+        # detector electronics time-tag clicks as they arrive
+        self._submit("detection", 0.0, self._on_detected, n_clicks)
+
+    def _on_detected(self, n_clicks):
+        cfg = self.config
+        if n_clicks == 0:
+            return
+        rounds = simulate_session(n_clicks, cfg.eve_config, cfg.noise_prob, self.rng)
+        # dark counts give Bob a random bit
+        dark = self.rng.random(n_clicks) < cfg.dark_fraction
+        rounds.bob_bits[dark] = self.rng.integers(0, 2, int(dark.sum()))
+        mask = rounds.sift_mask()
+        sifted = int(mask.sum())
+        errors = int(((rounds.alice_bits != rounds.bob_bits) & mask).sum())
+
+        message = n_clicks * cfg.sift_bits_per_click
+        service = cfg.rtt + message / cfg.classical_bandwidth
+        self._submit("sifting", service, self._on_sifted, sifted, errors)
+
+    def _on_sifted(self, sifted, errors):
+        cfg = self.config
+        self.sifted_bits += sifted
+        self.pending_sifted += sifted
+        self.pending_errors += errors
+        while self.pending_sifted >= cfg.ec_block_bits:
+            # errors are spread evenly over the sifted bits of a block
+            block_errors = round(
+                self.pending_errors * cfg.ec_block_bits / self.pending_sifted
+            )
+            self.pending_sifted -= cfg.ec_block_bits
+            self.pending_errors -= block_errors
+            qber = block_errors / cfg.ec_block_bits
+
+            leaked = cfg.ec_efficiency * binary_entropy(qber) * cfg.ec_block_bits
+            service = (
+                cfg.ec_passes * cfg.rtt
+                + cfg.ec_block_bits / cfg.ec_throughput
+                + leaked / cfg.classical_bandwidth
+            )
+            self._submit("reconciliation", service, self._on_reconciled, qber)
+
+    def _on_reconciled(self, qber):
+        cfg = self.config
+        if qber > cfg.threshold:
+            self.aborted_blocks += 1
+            return
+        service = cfg.ec_block_bits / cfg.pa_throughput
+        self._submit("amplification", service, self._on_amplified, qber)
+
+    def _on_amplified(self, qber):
+        cfg = self.config
+        fraction = 1 - binary_entropy(qber) * (1 + cfg.ec_efficiency)
+        bits = int(max(fraction, 0.0) * cfg.ec_block_bits)
+        if bits > 0 and self.first_key_time is None:
+            self.first_key_time = float(self.now)
+        self.secure_bits += bits
+        self.key_log.append((self.now, bits))
+
+    def _emit(self, start):
+        # the source runs back to back; each batch reaches Bob one fibre delay
+        # after its last pulse leaves Alice
+        cfg = self.config
+        batch_time = cfg.pulses_per_batch / cfg.pulse_rate
+        self.pulses += cfg.pulses_per_batch
+        self.schedule(
+            batch_time + cfg.fibre_delay,
+            self._on_batch_arrival,
+            start,
+            cfg.pulses_per_batch,
+        )
+        self.batches_left -= 1
+        if self.batches_left > 0:
+            self.schedule(batch_time, self._emit, start + cfg.pulses_per_batch)
+
+    def run(self, duration, drain=True):
+        # run the source for `duration` simulated seconds; drain lets the
+        # classical pipeline finish what is still queued
+        started = time.perf_counter()
+        cfg = self.config
+        self.source_until = self.now + duration
+        self.batches_left = max(
+            int(round(duration * cfg.pulse_rate / cfg.pulses_per_batch)), 1
+        )
+        self.schedule(0.0, self._emit, self.pulses)
+
+        while self.events:
+            t, _, handler, args = self.events[0]
+            if not drain and t > self.source_until:
+                break
+            heapq.heappop(self.events)
+            self.now = t
+            self.n_events += 1
+            handler(*args)
+
+        self.wall_time = time.perf_counter() - started
+        return self.report()
+
+    def throughput(self):
+        # steady state: key produced after the first block, over the time since
+        if self.first_key_time is None or len(self.key_log) < 2:
+            return 0.0
+        times = np.array([t for t, _ in self.key_log])
+        bits = np.array([b for _, b in self.key_log])
+        span = times[-1] - self.first_key_time
+        return float(bits[1:].sum() / span) if span > 0 else 0.0
+
+    def stage_report(self):
+        # Utilization is over the whole run including the drain; Load is busy
+        # time per second of source activity, and a stage above 1 cannot keep
+        # up with the source
+        elapsed = self.now
+        source_time = self.pulses / self.config.pulse_rate
+        rows = [
+            {
+                "Stage": "source",
+                "Jobs": self.pulses // self.config.pulses_per_batch,
+                "Busy (s)": source_time,
+                "Utilization": source_time / elapsed if elapsed else 0.0,
+                "Mean Wait (s)": 0.0,
+                "Max Queue": 0,
+                "Backlog": 0,
+            }
+        ]
+        rows += [stage.stats(elapsed) for stage in self.stages.values()]
+        df = pd.DataFrame(rows)
+        df["Load"] = df["Busy (s)"] / source_time if source_time else 0.0
+        return df
+
+    def report(self):
+        stages = self.stage_report()
+        # the busiest downstream stage limits throughput once it saturates,
+        # otherwise the pipeline keeps pace and the source rate is the limit
+        downstream = stages.iloc[1:]
+        busiest = downstream.loc[downstream["Load"].idxmax()]
+        bottleneck = busiest["Stage"] if busiest["Load"] >= 1 else "source"
+        return {
+            "pulses": self.pulses,
+            "clicks": self.clicks,
+            "sifted_bits": self.sifted_bits,
+            "secure_bits": self.secure_bits,
+            "aborted_blocks": self.aborted_blocks,
+            "sim_time": self.now,
+            "time_to_first_key": self.first_key_time,
+            "throughput": self.throughput(),
+            "bottleneck": bottleneck,
+            "events": self.n_events,
+            "wall_time": self.wall_time,
+            "pulses_per_wall_second": (
+                self.pulses / self.wall_time if self.wall_time else 0.0
+            ),
+        }
+
+
+# %%
+if __name__ == "__main__":
+    for distance in (10, 50, 100):
+        sim = TimingSimulator(TimingConfig(distance_km=distance), seed=0)
+        report = sim.run(duration=0.2)
+        print(
+            f"{distance:>4d} km: first key {report['time_to_first_key']}, "
+            f"{report['throughput']:.3g} bit/s, bottleneck {report['bottleneck']}, "
+            f"{report['pulses']:.2g} pulses in {report['wall_time']:.2f}s"
+        )
+        print(sim.stage_report().round(4).to_string(index=False))
@@ -1,155 +1,371 @@
-import matplotlib.pyplot as plt
+# %%
+import threading
+from collections import OrderedDict
+
+import matplotlib
+
+# headless backend for the Streamlit server, must be set before pyplot loads
+matplotlib.use("Agg")
+
 import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
 
+from aggregate import Series, decimate, grouped_density, histogram
 
-class BB84Visualizer:
+# per-series point budget, roughly the pixel width of a plot
+MAX_POINTS = 2000
 
-    @staticmethod
-    def plot_qber_gauge(qber, threshold, title="Current QBER"):
-        fig, ax = plt.subplots(figsize=(6, 3))
 
-        values = [threshold * 0.5, threshold * 0.5, 0.3 - threshold]
-        colors = ["green", "yellow", "red"]
+class FigureCache:
+    # bounded LRU of reusable figures; figures are built once per key and then
+    # only have their artists updated. Figures are created without pyplot, and
+    # eviction only drops the cache's reference: another session may still be
+    # rendering an evicted figure, so it is left intact for GC to collect.
 
-        ax.barh(0, values[0], color=colors[0], alpha=0.3)
-        ax.barh(0, values[1], left=values[0], color=colors[1], alpha=0.3)
-        ax.barh(0, values[2], left=values[0] + values[1], color=colors[2], alpha=0.3)
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
 
-        ax.plot([qber, qber], [0, 0.5], "k-", linewidth=3)
-        ax.plot(qber, 0.5, "ko", markersize=10)
+    def get(self, key, figsize, build, ncols=1):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
 
-        ax.set_xlim(0, 0.3)
-        ax.set_ylim(-0.2, 1)
-        ax.set_yticks([])
-        ax.set_xlabel("QBER")
-        ax.set_title(title)
-        ax.axvline(
-            threshold, color="orange", linestyle="--", linewidth=2, label="Threshold"
+            fig = Figure(figsize=figsize)
+            axes = fig.subplots(1, ncols)
+            entry = (fig, build(fig, axes))
+            self.entries[key] = entry
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return entry
+
+    def close(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _zone(ax, bottom, top, color):
+    # full-width horizontal band in data y coordinates
+    patch = Rectangle(
+        (0, bottom),
+        1,
+        top - bottom,
+        transform=ax.get_yaxis_transform(),
+        alpha=0.2,
+        color=color,
+    )
+    ax.add_patch(patch)
+    return patch
+
+
+def _set_zone(patch, bottom, top):
+    patch.set_y(bottom)
+    patch.set_height(top - bottom)
+
+
+def _series(values, max_points):
+    # rounds/values for a per-round history, decimated to the point budget
+    if not isinstance(values, Series):
+        values = Series(np.arange(1, len(values) + 1), np.asarray(values))
+    if len(values) > max_points:
+        values = decimate(values, max_points)
+    return values
+
+
+def _padded(lo, hi, pad=0.05):
+    span = hi - lo if hi > lo else 1.0
+    return lo - pad * span, hi + pad * span
+
+
+class BB84Visualizer:
+
+    # shared by every browser session, about six plot kinds each
+    figures = FigureCache(maxsize=256)
+
+    @staticmethod
+    def plot_qber_gauge(qber, threshold, title="Current QBER", key=None):
+        def build(fig, ax):
+            bars = [
+                ax.barh(0, 0, color=c, alpha=0.3)[0] for c in ("green", "yellow", "red")
+            ]
+            (needle,) = ax.plot([0, 0], [0, 0.5], "k-", linewidth=3)
+            (tip,) = ax.plot([0], [0.5], "ko", markersize=10)
+            limit = ax.axvline(
+                0, color="orange", linestyle="--", linewidth=2, label="Threshold"
+            )
+
+            ax.set_xlim(0, 0.3)
+            ax.set_ylim(-0.2, 1)
+            ax.set_yticks([])
+            ax.set_xlabel("QBER")
+            ax.legend()
+            return ax, bars, needle, tip, limit
+
+        fig, (ax, bars, needle, tip, limit) = BB84Visualizer.figures.get(
+            ("qber_gauge", key), (6, 3), build
         )
-        ax.legend()
+
+        values = [threshold * 0.5, threshold * 0.5, 0.3 - threshold]
+        left = 0
+        for bar, value in zip(bars, values):
+            bar.set_x(left)
+            bar.set_width(value)
+            left += value
+
+        needle.set_data([qber, qber], [0, 0.5])
+        tip.set_data([qber], [0.5])
+        limit.set_xdata([threshold, threshold])
+        ax.set_title(title)
 
         return fig
 
     @staticmethod
-    def plot_qber_evolution(qber_history, threshold):
-        fig, ax = plt.subplots(figsize=(8, 3))
-        rounds = list(range(1, len(qber_history) + 1))
-
-        ax.plot(rounds, qber_history, "b-", linewidth=2, label="QBER")
-        ax.axhline(
-            threshold, color="red", linestyle="--", linewidth=2, label="Threshold"
-        )
-        ax.fill_between(
-            rounds, 0, threshold, alpha=0.2, color="green", label="Safe Zone"
-        )
-        ax.fill_between(
-            rounds, threshold, 0.3, alpha=0.2, color="red", label="Danger Zone"
+    def _build_qber_evolution(ax, with_labels=True):
+        (line,) = ax.plot([], [], "b-", linewidth=2, label="QBER")
+        limit = ax.axhline(
+            0, color="red", linestyle="--", linewidth=2, label="Threshold"
         )
+        safe = _zone(ax, 0, 0, "green")
+        danger = _zone(ax, 0, 0, "red")
+        if with_labels:
+            safe.set_label("Safe Zone")
+            danger.set_label("Danger Zone")
 
         ax.set_xlabel("Round")
         ax.set_ylabel("QBER")
-        ax.set_title("Quantum Bit Error Rate Evolution")
         ax.legend()
         ax.grid(True, alpha=0.3)
-
-        return fig
+        return line, limit, safe, danger
 
     @staticmethod
-    def plot_key_length_growth(key_len_history):
-        fig, ax = plt.subplots(figsize=(8, 3))
-        rounds = list(range(1, len(key_len_history) + 1))
+    def _update_qber_evolution(artists, series, threshold, top):
+        line, limit, safe, danger = artists
+        ax = line.axes
+
+        line.set_data(series.x, series.y)
+        limit.set_ydata([threshold, threshold])
+        _set_zone(safe, 0, threshold)
+        _set_zone(danger, threshold, top)
+
+        ax.set_xlim(*_padded(1, max(np.max(series.x, initial=1), 2)))
+        peak = max(np.max(series.y, initial=0.0), top, threshold)
+        ax.set_ylim(*_padded(0, peak))
 
-        ax.plot(rounds, key_len_history, "g-", linewidth=2)
+    @staticmethod
+    def _build_key_length(ax):
+        (line,) = ax.plot([], [], "g-", linewidth=2)
         ax.set_xlabel("Round")
         ax.set_ylabel("Sifted Key Length")
-        ax.set_title("Key Length Growth")
         ax.grid(True, alpha=0.3)
-
-        return fig
+        return line
 
     @staticmethod
-    def plot_game_statistics(qber_history, key_len_history, threshold):
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+    def _update_key_length(line, series):
+        line.set_data(series.x, series.y)
+        line.axes.set_xlim(*_padded(1, max(np.max(series.x, initial=1), 2)))
+        line.axes.set_ylim(*_padded(0, max(np.max(series.y, initial=0), 1)))
 
-        rounds = list(range(1, len(qber_history) + 1))
+    @staticmethod
+    def plot_qber_evolution(qber_history, threshold, key=None, max_points=MAX_POINTS):
+        def build(fig, ax):
+            ax.set_title("Quantum Bit Error Rate Evolution")
+            return BB84Visualizer._build_qber_evolution(ax)
 
-        # QBER evolution
-        ax1.plot(rounds, qber_history, "b-", linewidth=2)
-        ax1.axhline(
-            threshold, color="red", linestyle="--", linewidth=2, label="Threshold"
+        fig, artists = BB84Visualizer.figures.get(
+            ("qber_evolution", key), (8, 3), build
         )
-        ax1.fill_between(rounds, 0, threshold, alpha=0.2, color="green")
-        ax1.fill_between(
-            rounds, threshold, max(qber_history + [0.3]), alpha=0.2, color="red"
+        BB84Visualizer._update_qber_evolution(
+            artists, _series(qber_history, max_points), threshold, 0.3
         )
-        ax1.set_xlabel("Round")
-        ax1.set_ylabel("QBER")
-        ax1.set_title("QBER Evolution")
-        ax1.legend()
-        ax1.grid(True, alpha=0.3)
-
-        # Key length growth
-        ax2.plot(rounds, key_len_history, "g-", linewidth=2)
-        ax2.set_xlabel("Round")
-        ax2.set_ylabel("Sifted Key Length")
-        ax2.set_title("Key Length Growth")
-        ax2.grid(True, alpha=0.3)
 
         return fig
 
     @staticmethod
-    def plot_qber_distribution(df, threshold=0.11):
-        fig, ax = plt.subplots(figsize=(6, 4))
+    def plot_key_length_growth(key_len_history, key=None, max_points=MAX_POINTS):
+        def build(fig, ax):
+            ax.set_title("Key Length Growth")
+            return BB84Visualizer._build_key_length(ax)
 
-        no_eve = df[df["Eve Present"] == "No"]["QBER"]
-        eve = df[df["Eve Present"] == "Yes"]["QBER"]
+        fig, line = BB84Visualizer.figures.get(
+            ("key_length_growth", key), (8, 3), build
+        )
+        BB84Visualizer._update_key_length(line, _series(key_len_history, max_points))
 
-        ax.hist(no_eve, alpha=0.6, bins=20, label="No Eve", color="green")
-        ax.hist(eve, alpha=0.6, bins=20, label="Eve", color="red")
-        ax.axvline(
-            threshold, color="orange", linestyle="--", linewidth=2, label="Threshold"
+        return fig
+
+    @staticmethod
+    def plot_game_statistics(
+        qber_history, key_len_history, threshold, key=None, max_points=MAX_POINTS
+    ):
+        def build(fig, axes):
+            ax1, ax2 = axes
+            ax1.set_title("QBER Evolution")
+            ax2.set_title("Key Length Growth")
+            return (
+                BB84Visualizer._build_qber_evolution(ax1, with_labels=False),
+                BB84Visualizer._build_key_length(ax2),
+            )
+
+        fig, (qber_artists, key_line) = BB84Visualizer.figures.get(
+            ("game_statistics", key), (12, 4), build, ncols=2
+        )
+
+        qber_series = _series(qber_history, max_points)
+        top = max(np.max(qber_series.y, initial=0.0), 0.3)
+        BB84Visualizer._update_qber_evolution(qber_artists, qber_series, threshold, top)
+        BB84Visualizer._update_key_length(
+            key_line, _series(key_len_history, max_points)
         )
-        ax.set_xlabel("QBER")
-        ax.set_ylabel("Frequency")
-        ax.set_title("Error Rate Distribution")
-        ax.legend()
 
         return fig
 
     @staticmethod
-    def plot_feature_space(df):
-        fig, ax = plt.subplots(figsize=(6, 4))
-
-        no_eve_df = df[df["Eve Present"] == "No"]
-        eve_df = df[df["Eve Present"] == "Yes"]
-
-        ax.scatter(
-            no_eve_df["QBER"],
-            no_eve_df["Sift Ratio"],
-            alpha=0.6,
-            label="No Eve",
-            color="green",
-            s=50,
+    def plot_qber_distribution(df, threshold=0.11, key=None):
+        # df: per-session DataFrame, or {"No"/"Yes": Histogram} binned upstream
+        def build(fig, ax):
+            no_eve = ax.stairs(
+                [0], [0, 1], fill=True, alpha=0.6, label="No Eve", color="green"
+            )
+            eve = ax.stairs([0], [0, 1], fill=True, alpha=0.6, label="Eve", color="red")
+            limit = ax.axvline(
+                0, color="orange", linestyle="--", linewidth=2, label="Threshold"
+            )
+            ax.set_xlabel("QBER")
+            ax.set_ylabel("Frequency")
+            ax.set_title("Error Rate Distribution")
+            ax.legend()
+            return ax, no_eve, eve, limit
+
+        fig, (ax, no_eve, eve, limit) = BB84Visualizer.figures.get(
+            ("qber_distribution", key), (6, 4), build
         )
-        ax.scatter(
-            eve_df["QBER"],
-            eve_df["Sift Ratio"],
-            alpha=0.6,
-            label="Eve",
-            color="red",
-            s=50,
+
+        if isinstance(df, dict):
+            hists = df
+        else:
+            hists = {
+                label: histogram(df.loc[df["Eve Present"] == label, "QBER"], 20)
+                for label in ("No", "Yes")
+            }
+
+        lo, hi, peak = threshold, threshold, 1
+        for patch, label in ((no_eve, "No"), (eve, "Yes")):
+            hist = hists.get(label)
+            if hist is None:
+                patch.set_data([0], [threshold, threshold])
+                continue
+            patch.set_data(hist.counts, hist.edges)
+            lo, hi = min(lo, hist.edges[0]), max(hi, hist.edges[-1])
+            peak = max(peak, hist.counts.max())
+
+        limit.set_xdata([threshold, threshold])
+        ax.set_xlim(*_padded(lo, hi))
+        ax.set_ylim(0, peak * 1.05)
+
+        return fig
+
+    @staticmethod
+    def plot_feature_space(df, key=None, max_points=MAX_POINTS, bins=(64, 64)):
+        # df: per-session DataFrame, or {"No"/"Yes": DensityGrid} binned
+        # upstream. Large frames are drawn as density grids instead of points.
+        def build(fig, ax):
+            empty = np.empty((0, 2))
+            no_eve = ax.scatter(
+                empty[:, 0], empty[:, 1], alpha=0.6, label="No Eve", color="green", s=50
+            )
+            eve = ax.scatter(
+                empty[:, 0], empty[:, 1], alpha=0.6, label="Eve", color="red", s=50
+            )
+            grids = [
+                ax.imshow(
+                    np.zeros((1, 1)),
+                    cmap=cmap,
+                    alpha=0.6,
+                    origin="lower",
+                    aspect="auto",
+                    interpolation="nearest",
+                    visible=False,
+                )
+                for cmap in ("Greens", "Reds")
+            ]
+            ax.set_xlabel("QBER")
+            ax.set_ylabel("Sift Ratio")
+            ax.set_title("2D Feature Space")
+            ax.legend(handles=[no_eve, eve])
+            ax.grid(True, alpha=0.3)
+            return ax, (no_eve, eve), grids
+
+        fig, (ax, scatters, grids) = BB84Visualizer.figures.get(
+            ("feature_space", key), (6, 4), build
         )
-        ax.set_xlabel("QBER")
-        ax.set_ylabel("Sift Ratio")
-        ax.set_title("2D Feature Space")
-        ax.legend()
-        ax.grid(True, alpha=0.3)
+
+        if not isinstance(df, dict) and len(df) <= max_points:
+            points = df[["QBER", "Sift Ratio"]].to_numpy(dtype=float)
+            for scatter, grid, label in zip(scatters, grids, ("No", "Yes")):
+                scatter.set_offsets(points[(df["Eve Present"] == label).to_numpy()])
+                scatter.set_visible(True)
+                grid.set_visible(False)
+
+            if len(points):
+                ax.set_xlim(*_padded(points[:, 0].min(), points[:, 0].max()))
+                ax.set_ylim(*_padded(points[:, 1].min(), points[:, 1].max()))
+            return fig
+
+        grid_data = df if isinstance(df, dict) else grouped_density(df, bins=bins)
+        xlim, ylim = None, None
+        for scatter, grid, label in zip(scatters, grids, ("No", "Yes")):
+            scatter.set_visible(False)
+            density = grid_data.get(label)
+            if density is None:
+                grid.set_visible(False)
+                continue
+
+            # empty cells stay transparent so both groups show through
+            counts = np.ma.masked_equal(density.counts.T, 0)
+            grid.set_data(counts)
+            grid.set_clim(0, max(counts.max(), 1) if counts.count() else 1)
+            extent = (
+                density.xedges[0],
+                density.xedges[-1],
+                density.yedges[0],
+                density.yedges[-1],
+            )
+            grid.set_extent(extent)
+            grid.set_visible(True)
+            xlim = (
+                extent[:2]
+                if xlim is None
+                else (min(xlim[0], extent[0]), max(xlim[1], extent[1]))
+            )
+            ylim = (
+                extent[2:]
+                if ylim is None
+                else (min(ylim[0], extent[2]), max(ylim[1], extent[3]))
+            )
+
+        if xlim is not None:
+            ax.set_xlim(*_padded(*xlim))
+            ax.set_ylim(*_padded(*ylim))
 
         return fig
 
     @staticmethod
-    def plot_ml_confidence(results_df):
-        fig, ax = plt.subplots(figsize=(10, 4))
+    def plot_ml_confidence(results_df, key=None):
+        fig, ax = BB84Visualizer.figures.get(
+            ("ml_confidence", key), (10, 4), lambda fig, ax: ax
+        )
+        # categorical bars change in number, so the axes are redrawn in place
+        ax.cla()
 
         scenarios = results_df["Scenario"].tolist()
         confidences = results_df["ML Confidence"].tolist()